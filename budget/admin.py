@@ -1,126 +1,292 @@
+import datetime
+import hashlib
+from urllib.parse import urlencode
+
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.decorators import permission_required
 from django.contrib.auth.models import User
-from django.db.models import Sum
+from django.core.exceptions import PermissionDenied
+from django.db.models import Count, Max, Q
+from django.http import Http404, JsonResponse
 from django.template.response import TemplateResponse
 from django.urls import path, reverse
+from django.utils import timezone
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import condition
 
-from income.models import Income
+from budget.cache import get_version, version_time
+from income.cache import get_cached_summary
+from income.exports import (
+    INCOME_EXPORT_FIELDS,
+    SUMMARY_EXPORT_FIELDS,
+    stream_export_from_request,
+)
+from income.models import Income, IncomeMonthlyRollup
+from income.rates import RATES_VERSION_KEY
+from income.summary import (
+    build_summary,
+    format_period,
+    parse_period,
+    period_range_filter,
+    period_span,
+    shift_period,
+)
+from vehicle.models import ServiceReminder
 
-MONTHS = [
-    "January",
-    "February",
-    "March",
-    "April",
-    "May",
-    "June",
-    "July",
-    "August",
-    "September",
-    "October",
-    "November",
-    "December",
-]
+SUMMARY_DEFAULT_MONTHS = 12
+INDEX_OVERDUE_REMINDERS = 10
 
 
-# Add a custom view to AdminSite
-def custom_summary_view(request):
-    incomes = Income.objects.filter(is_template=False)
-    # Calculate total take-home income grouped by user and month and currency
-    total_take_home_group = (
-        incomes.values(
+def get_summary_window(request):
+    """Resolve the ``from``/``to`` months of the Summary Report request.
+
+    Defaults to the trailing ``SUMMARY_DEFAULT_MONTHS`` months ending with the
+    current month.
+    """
+    today = timezone.localdate()
+    end = parse_period(request.GET.get("to")) or (today.year, today.month)
+    start = parse_period(request.GET.get("from")) or shift_period(
+        end, 1 - SUMMARY_DEFAULT_MONTHS
+    )
+    if start > end:
+        start, end = end, start
+    return start, end
+
+
+def get_summary_rollups(start, end, user_id=None):
+    """Rollup rows inside the requested window, optionally for one user."""
+    rollups = IncomeMonthlyRollup.objects.filter(
+        period_range_filter(start, end), income_count__gt=0
+    )
+    if user_id is not None:
+        rollups = rollups.filter(user_id=user_id)
+    return rollups.order_by("year", "month", "user__username", "currency")
+
+
+def has_older_rollups(start, user_id=None):
+    """Whether any month before ``start`` has incomes, one indexed EXISTS."""
+    rollups = IncomeMonthlyRollup.objects.filter(
+        Q(year__lt=start[0]) | Q(year=start[0], month__lt=start[1]),
+        income_count__gt=0,
+    )
+    if user_id is not None:
+        rollups = rollups.filter(user_id=user_id)
+    return rollups.exists()
+
+
+def get_summary_data(start, end, user_id=None):
+    """Summary Report data, cached per user and period until incomes change."""
+
+    def build():
+        # Precomputed take-home totals grouped by user, month and currency
+        rows = get_summary_rollups(start, end, user_id).values(
             "user__username",
-            "date__year",
-            "date__month",
+            "year",
+            "month",
             "currency",
-            "exchange_rate_lkr",
-            "tax",
-            "is_tax_paid",
+            "take_home",
+            "take_home_lkr",
+            "unconverted_take_home",
+            "payable_tax",
         )
-        .annotate(total_take_home=Sum("take_home"))
-        .order_by("user__username", "date__year", "date__month", "currency")
-    )
-    formatted_data = []
-    for item in total_take_home_group:
-        year = item["date__year"]
-        month = MONTHS[item["date__month"] - 1]  # Convert month number to name
-        user = item["user__username"]
-        currency = item["currency"]
-        total_take_home = round(item["total_take_home"], 2)
-
-        # Find or create the year-month entry
-        year_month_entry = next(
-            (
-                entry
-                for entry in formatted_data
-                if entry["year"] == year and entry["month"] == month
-            ),
-            None,
-        )
-        if not year_month_entry:
-            year_month_entry = {"year": year, "month": month, "users": []}
-            formatted_data.append(year_month_entry)
+        return build_summary(rows)
 
-        # Find or create the user entry
-        user_entry = next(
-            (u for u in year_month_entry["users"] if u["user"] == user), None
-        )
-        if not user_entry:
-            user_entry = {"user": user, "incomes": []}
-            year_month_entry["users"].append(user_entry)
-
-        # Add the currency and total to the user's incomes
-        sub_income = {"currency": currency, "total": total_take_home}
-        if currency != "LKR":
-            sub_income["total_lkr"] = total_take_home * item["exchange_rate_lkr"]
-            sub_income["payble_tax"] = 0
-            if not item["is_tax_paid"]:
-                sub_income["payble_tax"] = float(item["tax"])
-
-        user_entry["incomes"].append(sub_income)
-
-        # user total in LKR:
-        user_entry["total_income"] = round(
-            sum(
-                income["total_lkr"] if "total_lkr" in income else income["total"]
-                for income in user_entry["incomes"]
-            ),
-            2,
-        )
+    return get_cached_summary(user_id, start, end, build)
 
-        # Payble tax
-        user_entry["total_payble_tax"] = round(
-            sum(
-                income["payble_tax"] if "payble_tax" in income else 0
-                for income in user_entry["incomes"]
-            ),
-            2,
-        )
 
-        # Add the total income for the user in the year-month
-        year_month_entry["total_income"] = round(
-            sum(user["total_income"] for user in year_month_entry["users"]), 2
-        )
+def get_summary_user(request, users):
+    """Resolve the ``user`` filter to an id among ``(id, username)`` pairs.
 
-        # Total payble tax in month
-        year_month_entry["total_payble_tax"] = round(
-            sum(user["total_payble_tax"] for user in year_month_entry["users"]), 2
-        )
+    No filter means all users; an unknown username is a 404 rather than
+    silently falling back to every user's data.
+    """
+    username = request.GET.get("user", "")
+    if not username:
+        return None
+    for user_id, name in users:
+        if name == username:
+            return user_id
+    raise Http404("Unknown user")
+
+
+# Add a custom view to AdminSite
+def custom_summary_view(request):
+    start, end = get_summary_window(request)
+    users = list(User.objects.order_by("username").values_list("id", "username"))
+    user_id = get_summary_user(request, users)
+
+    formatted_data = get_summary_data(start, end, user_id)
+
+    # Keyset navigation: move the (year, month) window by its own width
+    span = period_span(start, end)
+    query = request.GET.copy()
+    older_url = newer_url = None
+    if has_older_rollups(start, user_id):
+        query["from"] = format_period(shift_period(start, -span))
+        query["to"] = format_period(shift_period(start, -1))
+        older_url = f"?{query.urlencode()}"
+    today = timezone.localdate()
+    if end < (today.year, today.month):
+        query["from"] = format_period(shift_period(end, 1))
+        query["to"] = format_period(shift_period(end, span))
+        newer_url = f"?{query.urlencode()}"
 
     context = dict(
         admin_site.each_context(request),
         title="Summary Report",
         summary_data=formatted_data,
+        period_from=format_period(start),
+        period_to=format_period(end),
+        selected_user=request.GET.get("user", ""),
+        usernames=[name for _, name in users],
+        older_url=older_url,
+        newer_url=newer_url,
+        export_query=urlencode(
+            {
+                "from": format_period(start),
+                "to": format_period(end),
+                "user": request.GET.get("user", ""),
+            }
+        ),
     )
     return TemplateResponse(request, "admin/custom_summary.html", context)
 
 
+SUMMARY_API_FIELDS = (
+    "year",
+    "month",
+    "users",
+    "total_income",
+    "total_payble_tax",
+    "missing_rates",
+)
+
+
+def get_summary_api_params(request):
+    """Window, user id and selected fields of a summary API request.
+
+    Memoized on the request so the ETag, Last-Modified and view callbacks
+    share one lookup.
+    """
+    if not hasattr(request, "_summary_api_params"):
+        start, end = get_summary_window(request)
+        user_id = get_summary_user(
+            request,
+            User.objects.filter(username=request.GET.get("user", "")).values_list(
+                "id", "username"
+            ),
+        )
+        fields = [
+            field
+            for field in request.GET.get("fields", "").split(",")
+            if field in SUMMARY_API_FIELDS
+        ] or list(SUMMARY_API_FIELDS)
+        freshness = get_summary_rollups(start, end, user_id).aggregate(
+            last_modified=Max("updated_at"), rows=Count("id")
+        )
+        # Unconverted take-home is converted with the current rates
+        freshness["rates_version"] = get_version(RATES_VERSION_KEY)
+        request._summary_api_params = (start, end, user_id, fields, freshness)
+    return request._summary_api_params
+
+
+def summary_api_etag(request):
+    start, end, user_id, fields, freshness = get_summary_api_params(request)
+    last_modified = freshness["last_modified"]
+    parts = [
+        format_period(start),
+        format_period(end),
+        str(user_id),
+        ",".join(fields),
+        str(freshness["rows"]),
+        last_modified.isoformat() if last_modified else "",
+        str(freshness["rates_version"]),
+    ]
+    return hashlib.md5("|".join(parts).encode(), usedforsecurity=False).hexdigest()
+
+
+def summary_api_last_modified(request):
+    freshness = get_summary_api_params(request)[4]
+    rates_changed = version_time(freshness["rates_version"])
+    if freshness["last_modified"] is None:
+        return rates_changed
+    return max(freshness["last_modified"], rates_changed)
+
+
+# Checked before the conditional GET, which would otherwise answer 304
+@permission_required("income.view_income", raise_exception=True)
+@gzip_page
+@condition(etag_func=summary_api_etag, last_modified_func=summary_api_last_modified)
+def summary_api_view(request):
+    start, end, user_id, fields, _ = get_summary_api_params(request)
+    summary_data = get_summary_data(start, end, user_id)
+    return JsonResponse(
+        {
+            "from": format_period(start),
+            "to": format_period(end),
+            "results": [
+                # missing_rates is only set on months with unconverted income
+                {field: entry.get(field, []) for field in fields}
+                for entry in summary_data
+            ],
+        }
+    )
+
+
+def summary_export_view(request):
+    if not request.user.has_perm("income.view_income"):
+        raise PermissionDenied
+    start, end = get_summary_window(request)
+    users = User.objects.filter(username=request.GET.get("user", "")).values_list(
+        "id", "username"
+    )
+    return stream_export_from_request(
+        request,
+        get_summary_rollups(start, end, get_summary_user(request, users)),
+        SUMMARY_EXPORT_FIELDS,
+        f"income-summary-{format_period(start)}-{format_period(end)}",
+    )
+
+
+def income_export_view(request):
+    if not request.user.has_perm("income.view_income"):
+        raise PermissionDenied
+    incomes = Income.objects.filter(is_template=False).order_by("date", "id")
+    start = parse_period(request.GET.get("from"))
+    end = parse_period(request.GET.get("to"))
+    if start:
+        incomes = incomes.filter(date__gte=datetime.date(*start, 1))
+    if end:
+        incomes = incomes.filter(date__lt=datetime.date(*shift_period(end, 1), 1))
+    if request.GET.get("user"):
+        incomes = incomes.filter(user__username=request.GET["user"])
+    return stream_export_from_request(request, incomes, INCOME_EXPORT_FIELDS, "incomes")
+
+
 class MyAdminSite(admin.AdminSite):
     site_header = "My Budget"
     site_title = "MyBudget"
     index_title = "Welcome to the Admin Portal"
+    index_template = "admin/budget_index.html"
+
+    def index(self, request, extra_context=None):
+        extra_context = extra_context or {}
+        if request.user.has_perm("vehicle.view_servicereminder"):
+            overdue = ServiceReminder.objects.overdue(
+                timezone.localdate()
+            ).select_related("vehicle")
+            extra_context.update(
+                overdue_reminders=overdue[:INDEX_OVERDUE_REMINDERS],
+                overdue_count=overdue.count(),
+                reminders_url=reverse("admin:vehicle_servicereminder_changelist"),
+            )
+        return super().index(request, extra_context)
 
     def get_urls(self):
+        # Imported here since the vehicle views import this module
+        from vehicle.views import parts_price_history_view, vehicle_analytics_view
+
         urls = super().get_urls()
         custom_urls = [
             path(
@@ -128,6 +294,31 @@ class MyAdminSite(admin.AdminSite):
                 self.admin_view(custom_summary_view),
                 name="custom-summary",
             ),
+            path(
+                "custom-summary/api/",
+                self.admin_view(summary_api_view),
+                name="custom-summary-api",
+            ),
+            path(
+                "custom-summary/export/",
+                self.admin_view(summary_export_view),
+                name="custom-summary-export",
+            ),
+            path(
+                "custom-summary/export/incomes/",
+                self.admin_view(income_export_view),
+                name="income-export",
+            ),
+            path(
+                "vehicle-analytics/",
+                self.admin_view(vehicle_analytics_view),
+                name="vehicle-analytics",
+            ),
+            path(
+                "parts-price-history/",
+                self.admin_view(parts_price_history_view),
+                name="parts-price-history",
+            ),
         ]
         return custom_urls + urls
 
@@ -148,6 +339,20 @@ class MyAdminSite(admin.AdminSite):
                     "add_url": None,
                     "perms": {"change": True},
                 },
+                {
+                    "name": "Vehicle Analytics",
+                    "object_name": "VehicleAnalytics",
+                    "admin_url": "/admin/vehicle-analytics/",
+                    "add_url": None,
+                    "perms": {"change": True},
+                },
+                {
+                    "name": "Parts Price History",
+                    "object_name": "PartsPriceHistory",
+                    "admin_url": "/admin/parts-price-history/",
+                    "add_url": None,
+                    "perms": {"change": True},
+                },
             ],
         }
 
@@ -0,0 +1,44 @@
+import datetime
+import time
+
+from django.core.cache import cache
+
+
+def new_version():
+    # Time based so a version evicted from the cache never restarts at a
+    # value that older entries were stored under, and so it tells when the
+    # versioned data last changed
+    return time.time_ns()
+
+
+def version_time(version):
+    """When ``version`` was issued, as an aware datetime."""
+    return datetime.datetime.fromtimestamp(version / 10**9, tz=datetime.timezone.utc)
+
+
+def get_versions(*keys):
+    """Current versions stored under ``keys``, starting missing ones afresh."""
+    versions = cache.get_many(keys)
+    missing = {key: new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, timeout=None)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def get_version(key):
+    return get_versions(key)[0]
+
+
+def bump_versions(*keys):
+    """Invalidate every cache entry keyed with the current versions of ``keys``."""
+    cache.set_many({key: new_version() for key in keys}, timeout=None)
+
+
+def get_or_build(key, build, timeout):
+    """The value cached under ``key``, built and stored on a miss."""
+    value = cache.get(key)
+    if value is None:
+        value = build()
+        cache.set(key, value, timeout)
+    return value
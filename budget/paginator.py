@@ -0,0 +1,35 @@
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import Paginator
+from django.utils.functional import cached_property
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator that caches ``COUNT(*)`` of the page query for a short time.
+
+    On large tables the count is the most expensive query of a changelist
+    page; paging, sorting and revisiting the same filters reuse the cached
+    total instead.
+    """
+
+    count_timeout = 60
+
+    @cached_property
+    def count(self):
+        query = getattr(self.object_list, "query", None)
+        if query is None:
+            return super().count
+        try:
+            sql = str(query)
+        except Exception:
+            return super().count
+        key = (
+            "paginator-count:"
+            + hashlib.md5(sql.encode(), usedforsecurity=False).hexdigest()
+        )
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, self.count_timeout)
+        return count
@@ -0,0 +1,24 @@
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+
+def apply_deltas(manager, key_fields, deltas, **extra):
+    """Add ``deltas`` to the aggregate rows of ``manager``.
+
+    ``deltas`` maps tuples of ``key_fields`` values to ``{field: delta}``.
+    Existing rows are updated with ``F()`` expressions, so concurrent writers
+    never lose each other's changes, and missing rows are created. ``extra``
+    values are set on every row that is written.
+    """
+    with transaction.atomic():
+        for key, values in deltas.items():
+            lookup = dict(zip(key_fields, key))
+            changes = {name: F(name) + value for name, value in values.items()}
+            if manager.filter(**lookup).update(**changes, **extra):
+                continue
+            try:
+                with transaction.atomic():
+                    manager.create(**lookup, **values, **extra)
+            except IntegrityError:
+                # Created concurrently, fall back to the delta update
+                manager.filter(**lookup).update(**changes, **extra)
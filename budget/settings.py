@@ -89,6 +89,24 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+
+# The summary, analytics and exchange rate caches are invalidated by bumping
+# version keys, so every worker process must share one backend. The file
+# based default works for several workers on one host; use Redis or
+# Memcached (CACHE_BACKEND/CACHE_LOCATION) across hosts. A per-process
+# LocMemCache would keep serving stale reports until their timeout expires.
+CACHES = {
+    "default": {
+        "BACKEND": os.environ.get(
+            "CACHE_BACKEND", "django.core.cache.backends.filebased.FileBasedCache"
+        ),
+        "LOCATION": os.environ.get("CACHE_LOCATION", BASE_DIR / "cache"),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -131,6 +149,15 @@ STATIC_ROOT = f"{SERVER_PUBLIC_FOLDER}/static/"
 MEDIA_URL = "media/"
 MEDIA_ROOT = f"{SERVER_PUBLIC_FOLDER}/media/"
 
+# Let the web server send protected documents: "X-Accel-Redirect" (nginx,
+# with DOCUMENT_SENDFILE_PREFIX as an internal location aliased to
+# MEDIA_ROOT) or "X-Sendfile" (Apache mod_xsendfile). Unset, Django streams
+# the file itself.
+DOCUMENT_SENDFILE_HEADER = os.environ.get("DOCUMENT_SENDFILE_HEADER")
+DOCUMENT_SENDFILE_PREFIX = os.environ.get(
+    "DOCUMENT_SENDFILE_PREFIX", "/protected-media/"
+)
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
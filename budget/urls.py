@@ -18,8 +18,20 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path
 
+from vehicle.views import document_download_view
+
 from .admin import admin_site
 
 urlpatterns = [
     path("admin/", admin_site.urls),
+    path(
+        "documents/<int:pk>/",
+        admin_site.admin_view(document_download_view, cacheable=True),
+        name="vehicle-document-download",
+    ),
+    path(
+        "documents/<int:pk>/<slug:variant>/",
+        admin_site.admin_view(document_download_view, cacheable=True),
+        name="vehicle-document-preview",
+    ),
 ]
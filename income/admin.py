@@ -1,16 +1,23 @@
-from urllib.parse import urlencode
+import calendar
+import copy
+import datetime
 
 from django import forms
 from django.contrib import admin, messages
-from django.http import HttpResponseRedirect
+from django.db import transaction
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.response import TemplateResponse
 from django.urls import path, reverse
 
 from budget.admin import admin_site
+from budget.paginator import CachedCountPaginator
 
-from .forms import GenerateFromTemplateForm
-from .models import Income, Source
+from .exports import INCOME_EXPORT_FIELDS, stream_export
+from .forms import BulkGenerateFromTemplateForm, GenerateFromTemplateForm
+from .models import Currency, ExchangeRate, Income, IncomeMonthlyRollup, Source
+from .payroll import apply_payroll
+from .rates import exchange_rates
+from .summary import period_span, shift_period
 
 
 class SourceAdmin(admin.ModelAdmin):
@@ -18,6 +25,12 @@ class SourceAdmin(admin.ModelAdmin):
     search_fields = ["name"]
 
 
+class ExchangeRateAdmin(admin.ModelAdmin):
+    list_display = ("currency", "date", "rate")
+    list_filter = ("currency",)
+    date_hierarchy = "date"
+
+
 class IncomeForm(forms.ModelForm):
     def clean_exchange_rate_lkr(self):
         cleaned_data = super().clean()
@@ -50,6 +63,11 @@ class IncomeAdmin(admin.ModelAdmin):
         "take_home",
     )
     list_display_links = ("user", "source")
+    # Large-table mode: join the columns rendered per row, cache the page
+    # count and skip the second unfiltered COUNT(*)
+    list_select_related = ("user", "source")
+    paginator = CachedCountPaginator
+    show_full_result_count = False
     fields = (
         "is_template",
         "user",
@@ -72,12 +90,18 @@ class IncomeAdmin(admin.ModelAdmin):
         "etf_employer",
         "take_home",
     )
-    ordering = ["-date__year", "-date__month", "user__username", "source__name"]
+    ordering = ["-period", "user__username", "source__name"]
     readonly_fields = ("epf_user", "epf_employer", "etf_employer", "take_home")
     list_filter = ("user", "date", "is_template")
     date_hierarchy = "date"
     # change_list_template = "income_changelist.html"
     change_list_template = "admin/income/income_change_list.html"
+    actions = [
+        "export_as_csv",
+        "export_as_jsonl",
+        "export_as_csv_gzip",
+        "export_as_jsonl_gzip",
+    ]
 
     def get_income_month(self, obj):
         return obj.date.strftime("%Y %B") if obj.date else "No Date"
@@ -86,9 +110,30 @@ class IncomeAdmin(admin.ModelAdmin):
         return obj.currency
 
     def save_model(self, request, obj, form, change):
+        # Income.save keeps IncomeMonthlyRollup in step with the new values
         self._recalculate_fields(obj)
         super().save_model(request, obj, form, change)
 
+    @admin.action(description="Export selected incomes as CSV")
+    def export_as_csv(self, request, queryset):
+        return stream_export(queryset, INCOME_EXPORT_FIELDS, "incomes", "csv")
+
+    @admin.action(description="Export selected incomes as JSON lines")
+    def export_as_jsonl(self, request, queryset):
+        return stream_export(queryset, INCOME_EXPORT_FIELDS, "incomes", "jsonl")
+
+    @admin.action(description="Export selected incomes as gzipped CSV")
+    def export_as_csv_gzip(self, request, queryset):
+        return stream_export(
+            queryset, INCOME_EXPORT_FIELDS, "incomes", "csv", compress=True
+        )
+
+    @admin.action(description="Export selected incomes as gzipped JSON lines")
+    def export_as_jsonl_gzip(self, request, queryset):
+        return stream_export(
+            queryset, INCOME_EXPORT_FIELDS, "incomes", "jsonl", compress=True
+        )
+
     def get_urls(self):
         urls = super().get_urls()
         custom_urls = [
@@ -97,6 +142,11 @@ class IncomeAdmin(admin.ModelAdmin):
                 self.admin_site.admin_view(self.generate_from_template_view),
                 name="income-generate-template",
             ),
+            path(
+                "generate-from-template/bulk/",
+                self.admin_site.admin_view(self.bulk_generate_from_template_view),
+                name="income-bulk-generate-template",
+            ),
         ]
         return custom_urls + urls
 
@@ -106,11 +156,14 @@ class IncomeAdmin(admin.ModelAdmin):
         extra_context["generate_template_url"] = reverse(
             "admin:income-generate-template"
         )
+        extra_context["bulk_generate_template_url"] = reverse(
+            "admin:income-bulk-generate-template"
+        )
 
         if "is_template__exact" not in request.GET:
-            q = request.GET.copy()
-            q["is_template__exact"] = "0"
-            return HttpResponseRedirect(f"{request.path}?{urlencode(q)}")
+            # Default to non-template incomes without a redirect round-trip
+            request.GET = request.GET.copy()
+            request.GET["is_template__exact"] = "0"
         return super().changelist_view(request, extra_context=extra_context)
 
     def generate_from_template_view(self, request):
@@ -124,7 +177,12 @@ class IncomeAdmin(admin.ModelAdmin):
                 new_income.pk = None
                 new_income.date = date
                 new_income.is_template = False
-                # self._recalculate_fields(new_income)
+                exchange_rate_lkr = form.cleaned_data["exchange_rate_lkr"]
+                if exchange_rate_lkr:
+                    new_income.exchange_rate_lkr = exchange_rate_lkr
+                elif new_income.exchange_rate_lkr is None:
+                    new_income.exchange_rate_lkr = self._lookup_rate(new_income)
+                self._recalculate_fields(new_income)
                 new_income.save()
 
                 self.message_user(
@@ -146,37 +204,103 @@ class IncomeAdmin(admin.ModelAdmin):
             },
         )
 
-    def _recalculate_fields(self, obj):
-        is_salary_in_lkr = obj.type == "Salary" and obj.currency == "LKR"
-
-        if is_salary_in_lkr:
-            if obj.is_allowance_for_funds:
-                obj.epf_user = (float(obj.basic_amount) + float(obj.allowance)) * 0.08
-                obj.epf_employer = (
-                    float(obj.basic_amount) + float(obj.allowance)
-                ) * 0.12
-                obj.etf_employer = (
-                    float(obj.basic_amount) + float(obj.allowance)
-                ) * 0.03
-            else:
-                obj.epf_user = float(obj.basic_amount) * 0.08
-                obj.epf_employer = float(obj.basic_amount) * 0.12
-                obj.etf_employer = float(obj.basic_amount) * 0.03
+    def bulk_generate_from_template_view(self, request):
+        if request.method == "POST":
+            form = BulkGenerateFromTemplateForm(request.POST)
+            if form.is_valid():
+                created, skipped = self._generate_from_templates(
+                    form.cleaned_data["templates"],
+                    form.cleaned_data["from_month"],
+                    form.cleaned_data["to_month"],
+                    form.cleaned_data["day"],
+                    form.cleaned_data["exchange_rate_lkr"],
+                )
+                self.message_user(
+                    request,
+                    f"Generated {created} income records, "
+                    f"skipped {skipped} months that already had one.",
+                    level=messages.SUCCESS,
+                )
+                return redirect("../..")
         else:
-            obj.epf_user = 0
-            obj.epf_employer = 0
-            obj.etf_employer = 0
-
-        obj.take_home = (
-            float(obj.basic_amount)
-            + float(obj.allowance)
-            - float(obj.epf_user)
-            - float(obj.stamp_duty)
-            - float(obj.other_deductions)
+            form = BulkGenerateFromTemplateForm()
+
+        return render(
+            request,
+            "admin/income/income_generate_form.html",
+            {
+                "form": form,
+                "title": "Generate Incomes From Templates",
+                "opts": self.model._meta,
+            },
+        )
+
+    def _generate_from_templates(
+        self, templates, start, end, day, exchange_rate_lkr=None
+    ):
+        """Clone ``templates`` into every month from ``start`` to ``end``.
+
+        Months that already have a non-template income for the same user,
+        source, type and currency are skipped. Derived fields are computed in
+        memory and the clones are written with a single ``bulk_create``.
+        """
+        periods = [shift_period(start, i) for i in range(period_span(start, end))]
+        existing = set(
+            Income.objects.filter(
+                is_template=False,
+                user__in={t.user_id for t in templates},
+                source__in={t.source_id for t in templates},
+                period__gte=start[0] * 100 + start[1],
+                period__lte=end[0] * 100 + end[1],
+            ).values_list("user", "source", "type", "currency", "period")
         )
-        if obj.is_tax_paid:
-            obj.take_home -= float(obj.tax)
+
+        new_incomes = []
+        skipped = 0
+        for template in templates:
+            for year, month in periods:
+                period = year * 100 + month
+                key = (
+                    template.user_id,
+                    template.source_id,
+                    template.type,
+                    template.currency,
+                    period,
+                )
+                if key in existing:
+                    skipped += 1
+                    continue
+                new_income = copy.copy(template)
+                new_income.pk = None
+                new_income.is_template = False
+                new_income.date = datetime.date(
+                    year, month, min(day, calendar.monthrange(year, month)[1])
+                )
+                if exchange_rate_lkr:
+                    new_income.exchange_rate_lkr = exchange_rate_lkr
+                elif new_income.exchange_rate_lkr is None:
+                    new_income.exchange_rate_lkr = self._lookup_rate(new_income)
+                self._recalculate_fields(new_income)
+                new_incomes.append(new_income)
+                # Templates sharing a user, source, type and currency fill a
+                # month once
+                existing.add(key)
+
+        with transaction.atomic():
+            Income.objects.bulk_create(new_incomes)
+            IncomeMonthlyRollup.objects.apply(added=new_incomes)
+        return len(new_incomes), skipped
+
+    def _lookup_rate(self, income):
+        """Rate from the ExchangeRate table for a foreign-currency income."""
+        if income.currency == Currency.LKR:
+            return None
+        return exchange_rates.rate(income.currency, income.date)
+
+    def _recalculate_fields(self, obj):
+        apply_payroll([obj])
 
 
 admin_site.register(Income, IncomeAdmin)
 admin_site.register(Source, SourceAdmin)
+admin_site.register(ExchangeRate, ExchangeRateAdmin)
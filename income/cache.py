@@ -0,0 +1,39 @@
+from budget.cache import bump_versions, get_or_build, get_versions
+
+SUMMARY_CACHE_TIMEOUT = 60 * 60 * 24
+ALL_USERS = "all"
+# Part of every key, for changes that affect all users' summaries at once
+EPOCH = "epoch"
+
+
+def _version_key(scope):
+    return f"income-summary-version:{scope}"
+
+
+def bump_summary_versions(user_ids):
+    """Invalidate cached summaries of ``user_ids`` and the all-users summary."""
+    bump_versions(*(_version_key(scope) for scope in [ALL_USERS, *set(user_ids)]))
+
+
+def bump_summary_epoch():
+    """Invalidate every cached summary, e.g. after a rebuild or new rates."""
+    bump_versions(_version_key(EPOCH))
+
+
+def summary_cache_key(user_id, start, end):
+    """Versioned key for the summary of one user (or all users) and period.
+
+    A user's key only changes with that user's incomes and the epoch, so
+    writes for one user keep the others' summaries cached.
+    """
+    scope = ALL_USERS if user_id is None else user_id
+    epoch, version = get_versions(_version_key(EPOCH), _version_key(scope))
+    return (
+        f"income-summary:{scope}:{epoch}.{version}:"
+        f"{start[0]}-{start[1]}:{end[0]}-{end[1]}"
+    )
+
+
+def get_cached_summary(user_id, start, end, build):
+    key = summary_cache_key(user_id, start, end)
+    return get_or_build(key, build, SUMMARY_CACHE_TIMEOUT)
@@ -0,0 +1,112 @@
+import csv
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import StreamingHttpResponse
+
+EXPORT_CHUNK_SIZE = 2000
+
+INCOME_EXPORT_FIELDS = [
+    "id",
+    "user__username",
+    "source__name",
+    "currency",
+    "exchange_rate_lkr",
+    "date",
+    "type",
+    "basic_amount",
+    "allowance",
+    "is_allowance_for_funds",
+    "stamp_duty",
+    "epf_user",
+    "tax",
+    "is_tax_paid",
+    "other_deductions",
+    "take_home",
+    "epf_employer",
+    "etf_employer",
+    "note",
+]
+
+SUMMARY_EXPORT_FIELDS = [
+    "user__username",
+    "year",
+    "month",
+    "currency",
+    "income_count",
+    "take_home",
+    "take_home_lkr",
+    "unconverted_take_home",
+    "payable_tax",
+]
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "jsonl": "application/x-ndjson",
+}
+
+
+class Echo:
+    """File-like object that hands each written line back to the caller."""
+
+    def write(self, value):
+        return value
+
+
+def iter_csv(fields, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_jsonl(fields, rows):
+    encoder = DjangoJSONEncoder()
+    for row in rows:
+        yield encoder.encode(dict(zip(fields, row))) + "\n"
+
+
+def iter_gzip(chunks):
+    """Gzip-compress a stream of text chunks without buffering the output."""
+    compressor = zlib.compressobj(wbits=zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def stream_export(queryset, fields, filename, export_format="csv", compress=False):
+    """Stream ``queryset`` as CSV or JSON lines, optionally gzip-compressed.
+
+    Rows are read with ``values_list().iterator()`` so the full result set is
+    never held in memory.
+    """
+    if export_format not in EXPORT_FORMATS:
+        export_format = "csv"
+    rows = queryset.values_list(*fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    if export_format == "jsonl":
+        chunks = iter_jsonl(fields, rows)
+    else:
+        chunks = iter_csv(fields, rows)
+
+    filename = f"{filename}.{export_format}"
+    content_type = EXPORT_FORMATS[export_format]
+    if compress:
+        chunks = iter_gzip(chunks)
+        filename += ".gz"
+        content_type = "application/gzip"
+
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    response["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def stream_export_from_request(request, queryset, fields, filename):
+    return stream_export(
+        queryset,
+        fields,
+        filename,
+        export_format=request.GET.get("format", "csv"),
+        compress=request.GET.get("gzip") in ("1", "true"),
+    )
@@ -2,6 +2,9 @@ from django import forms
 from django.utils import timezone
 
 from .models import Income
+from .summary import parse_period, period_span
+
+MAX_BULK_MONTHS = 120
 
 
 class GenerateFromTemplateForm(forms.Form):
@@ -21,3 +24,59 @@ class GenerateFromTemplateForm(forms.Form):
         widget=forms.DateInput(attrs={"type": "date"}),
         label="Date",
     )
+
+
+class BulkGenerateFromTemplateForm(forms.Form):
+    templates = forms.ModelMultipleChoiceField(
+        queryset=Income.objects.filter(is_template=True),
+        widget=forms.CheckboxSelectMultiple,
+        label="Templates",
+        help_text="Select one or more income templates",
+    )
+    from_month = forms.CharField(
+        widget=forms.DateInput(attrs={"type": "month"}),
+        label="From month",
+        help_text="First month to generate (YYYY-MM)",
+    )
+    to_month = forms.CharField(
+        widget=forms.DateInput(attrs={"type": "month"}),
+        label="To month",
+        help_text="Last month to generate (YYYY-MM)",
+    )
+    day = forms.IntegerField(
+        min_value=1,
+        max_value=31,
+        initial=1,
+        help_text="Day of the month for the generated records",
+    )
+    exchange_rate_lkr = forms.DecimalField(
+        max_digits=10,
+        decimal_places=2,
+        required=False,
+        help_text="Exchange rate to LKR (if applicable)",
+    )
+
+    def clean_from_month(self):
+        return self._clean_period("from_month")
+
+    def clean_to_month(self):
+        return self._clean_period("to_month")
+
+    def _clean_period(self, name):
+        period = parse_period(self.cleaned_data[name])
+        if period is None:
+            raise forms.ValidationError("Enter a month as YYYY-MM.")
+        return period
+
+    def clean(self):
+        cleaned_data = super().clean()
+        start = cleaned_data.get("from_month")
+        end = cleaned_data.get("to_month")
+        if start and end:
+            if start > end:
+                raise forms.ValidationError("From month must not be after To month.")
+            if period_span(start, end) > MAX_BULK_MONTHS:
+                raise forms.ValidationError(
+                    f"Generate at most {MAX_BULK_MONTHS} months at a time."
+                )
+        return cleaned_data
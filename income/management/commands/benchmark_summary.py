@@ -0,0 +1,143 @@
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+
+from income.summary import MONTHS, build_summary
+
+
+def legacy_build_summary(rows):
+    """The original nested ``next()`` scan from ``custom_summary_view``."""
+    formatted_data = []
+    for item in rows:
+        year = item["date__year"]
+        month = MONTHS[item["date__month"] - 1]
+        user = item["user__username"]
+        currency = item["currency"]
+        total_take_home = round(item["total_take_home"], 2)
+
+        year_month_entry = next(
+            (
+                entry
+                for entry in formatted_data
+                if entry["year"] == year and entry["month"] == month
+            ),
+            None,
+        )
+        if not year_month_entry:
+            year_month_entry = {"year": year, "month": month, "users": []}
+            formatted_data.append(year_month_entry)
+
+        user_entry = next(
+            (u for u in year_month_entry["users"] if u["user"] == user), None
+        )
+        if not user_entry:
+            user_entry = {"user": user, "incomes": []}
+            year_month_entry["users"].append(user_entry)
+
+        sub_income = {"currency": currency, "total": total_take_home}
+        if currency != "LKR":
+            sub_income["total_lkr"] = total_take_home * item["exchange_rate_lkr"]
+            sub_income["payble_tax"] = 0
+            if not item["is_tax_paid"]:
+                sub_income["payble_tax"] = float(item["tax"])
+
+        user_entry["incomes"].append(sub_income)
+        user_entry["total_income"] = round(
+            sum(
+                income["total_lkr"] if "total_lkr" in income else income["total"]
+                for income in user_entry["incomes"]
+            ),
+            2,
+        )
+        user_entry["total_payble_tax"] = round(
+            sum(
+                income["payble_tax"] if "payble_tax" in income else 0
+                for income in user_entry["incomes"]
+            ),
+            2,
+        )
+        year_month_entry["total_income"] = round(
+            sum(user["total_income"] for user in year_month_entry["users"]), 2
+        )
+        year_month_entry["total_payble_tax"] = round(
+            sum(user["total_payble_tax"] for user in year_month_entry["users"]), 2
+        )
+    return formatted_data
+
+
+def generate_rows(count, users=12, seed=0):
+    """Synthetic grouped rows, ordered the way the report query orders them."""
+    rng = random.Random(seed)
+    currencies = ["AUD", "EUR", "LKR"]
+    per_user = max(count // users, 1)
+    rows = []
+    for u in range(users):
+        for i in range(per_user):
+            months = i // len(currencies)
+            year, month = 2000 + months // 12, months % 12 + 1
+            currency = currencies[i % len(currencies)]
+            rate = Decimal(rng.randint(100, 400))
+            tax = Decimal(rng.randint(0, 5000))
+            is_tax_paid = rng.random() < 0.5
+            take_home = Decimal(rng.randint(1000, 900000)) / 100
+            rows.append(
+                {
+                    # Legacy grouping, one row per rate/tax combination
+                    "user__username": f"user{u:02d}",
+                    "date__year": year,
+                    "date__month": month,
+                    "currency": currency,
+                    "exchange_rate_lkr": rate,
+                    "tax": tax,
+                    "is_tax_paid": is_tax_paid,
+                    "total_take_home": take_home,
+                    # IncomeMonthlyRollup columns for the same cell
+                    "year": year,
+                    "month": month,
+                    "take_home": take_home,
+                    "take_home_lkr": take_home * rate,
+                    "unconverted_take_home": 0,
+                    "payable_tax": 0 if is_tax_paid else tax,
+                }
+            )
+    return rows
+
+
+class Command(BaseCommand):
+    help = "Compare the legacy and single-pass Summary Report builders."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            default="1000,10000,50000,100000,500000",
+            help="Comma separated grouped row counts to benchmark.",
+        )
+        parser.add_argument("--users", type=int, default=12)
+        parser.add_argument(
+            "--legacy-max",
+            type=int,
+            default=100000,
+            help="Skip the quadratic legacy builder above this many rows.",
+        )
+
+    def handle(self, *args, **options):
+        sizes = [int(size) for size in options["sizes"].split(",")]
+        self.stdout.write(f"{'rows':>10} {'legacy (s)':>12} {'builder (s)':>12}")
+        for size in sizes:
+            rows = generate_rows(size, users=options["users"])
+
+            start = time.perf_counter()
+            new = build_summary(rows)
+            new_elapsed = time.perf_counter() - start
+
+            legacy_elapsed = "skipped"
+            if size <= options["legacy_max"]:
+                start = time.perf_counter()
+                old = legacy_build_summary(rows)
+                legacy_elapsed = f"{time.perf_counter() - start:.3f}"
+                if old != new:
+                    raise CommandError(f"The builders disagree at {size} rows")
+
+            self.stdout.write(f"{size:>10} {legacy_elapsed:>12} {new_elapsed:>12.3f}")
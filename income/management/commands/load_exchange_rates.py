@@ -0,0 +1,59 @@
+import csv
+import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from income.models import Currency, ExchangeRate, exchange_rates_changed
+
+
+class Command(BaseCommand):
+    help = (
+        "Load exchange rates from CSV files with currency,date,rate columns. "
+        "Existing (currency, date) rates are updated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument("--date-format", default="%Y-%m-%d")
+
+    def handle(self, *args, **options):
+        currencies = {code for code, _ in Currency.CHOICES}
+        loaded = 0
+        with transaction.atomic():
+            for path in options["files"]:
+                batch = []
+                with open(path, newline="") as handle:
+                    for line, row in enumerate(csv.DictReader(handle), start=2):
+                        try:
+                            rate = ExchangeRate(
+                                currency=row["currency"].strip().upper(),
+                                date=datetime.datetime.strptime(
+                                    row["date"].strip(), options["date_format"]
+                                ).date(),
+                                rate=Decimal(row["rate"].strip()),
+                            )
+                        except (KeyError, ValueError, InvalidOperation) as exc:
+                            raise CommandError(f"{path}:{line}: {exc}")
+                        if rate.currency not in currencies:
+                            raise CommandError(
+                                f"{path}:{line}: unknown currency {rate.currency}"
+                            )
+                        batch.append(rate)
+                        if len(batch) >= options["batch_size"]:
+                            loaded += self.write(batch)
+                            batch = []
+                loaded += self.write(batch)
+            transaction.on_commit(exchange_rates_changed)
+        self.stdout.write(self.style.SUCCESS(f"Loaded {loaded} exchange rates."))
+
+    def write(self, batch):
+        ExchangeRate.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=["currency", "date"],
+            update_fields=["rate"],
+        )
+        return len(batch)
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from income.models import IncomeMonthlyRollup
+
+
+class Command(BaseCommand):
+    help = "Rebuild the IncomeMonthlyRollup table from all Income rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        count = IncomeMonthlyRollup.objects.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt {count} rollup rows."))
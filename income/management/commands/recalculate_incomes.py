@@ -0,0 +1,65 @@
+import copy
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from income.models import Income, IncomeMonthlyRollup
+from income.payroll import PAYROLL_FIELDS, apply_payroll
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate EPF, ETF and take-home for every Income and fix rows whose "
+        "stored values differ from the payroll engine."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=2000)
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report mismatching rows without writing them.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        start = time.perf_counter()
+        processed = fixed = 0
+
+        chunk = []
+        incomes = Income.objects.order_by("pk").iterator(chunk_size=chunk_size)
+        for income in incomes:
+            chunk.append(income)
+            if len(chunk) >= chunk_size:
+                fixed += self.fix_chunk(chunk, options["dry_run"])
+                processed += len(chunk)
+                chunk = []
+        fixed += self.fix_chunk(chunk, options["dry_run"])
+        processed += len(chunk)
+
+        elapsed = time.perf_counter() - start
+        rate = processed / elapsed if elapsed else 0
+        action = "would fix" if options["dry_run"] else "fixed"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Processed {processed} incomes, {action} {fixed} "
+                f"in {elapsed:.2f}s ({rate:,.0f} rows/s)."
+            )
+        )
+
+    def fix_chunk(self, chunk, dry_run):
+        take_home = {income.pk: income.take_home for income in chunk}
+        changed = apply_payroll(chunk)
+        if changed and not dry_run:
+            # Only take_home feeds the rollup, so the old contribution is the
+            # changed row with its previous take_home restored
+            previous = []
+            for income in changed:
+                old = copy.copy(income)
+                old.take_home = take_home[income.pk]
+                previous.append(old)
+            with transaction.atomic():
+                Income.objects.bulk_update(changed, PAYROLL_FIELDS)
+                IncomeMonthlyRollup.objects.apply(added=changed, removed=previous)
+        return len(changed)
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:12
+
+from collections import defaultdict
+from decimal import Decimal
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_rollup(apps, schema_editor):
+    Income = apps.get_model("income", "Income")
+    IncomeMonthlyRollup = apps.get_model("income", "IncomeMonthlyRollup")
+    totals = defaultdict(lambda: [0, Decimal(0), Decimal(0), Decimal(0)])
+    incomes = Income.objects.filter(is_template=False, date__isnull=False)
+    for income in incomes.iterator():
+        key = (income.user_id, income.date.year, income.date.month, income.currency)
+        take_home = Decimal(income.take_home)
+        rate = 1 if income.currency == "LKR" else income.exchange_rate_lkr or 0
+        row = totals[key]
+        row[0] += 1
+        row[1] += take_home
+        row[2] += take_home * rate
+        row[3] += 0 if income.is_tax_paid else income.tax
+    IncomeMonthlyRollup.objects.bulk_create(
+        IncomeMonthlyRollup(
+            user_id=user_id,
+            year=year,
+            month=month,
+            currency=currency,
+            income_count=count,
+            take_home=take_home,
+            take_home_lkr=take_home_lkr,
+            payable_tax=payable_tax,
+        )
+        for (user_id, year, month, currency), (
+            count,
+            take_home,
+            take_home_lkr,
+            payable_tax,
+        ) in totals.items()
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0006_income_is_allowance_for_funds"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="IncomeMonthlyRollup",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("year", models.PositiveSmallIntegerField()),
+                ("month", models.PositiveSmallIntegerField()),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[
+                            ("LKR", "Sri Lankan Rupee"),
+                            ("EUR", "Euro"),
+                            ("AUD", "Australian Dollar"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("income_count", models.IntegerField(default=0)),
+                (
+                    "take_home",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "take_home_lkr",
+                    models.DecimalField(decimal_places=4, default=0, max_digits=18),
+                ),
+                (
+                    "payable_tax",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["user", "year", "month", "currency"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "year", "month", "currency"),
+                        name="unique_income_monthly_rollup",
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_rollup, migrations.RunPython.noop),
+    ]
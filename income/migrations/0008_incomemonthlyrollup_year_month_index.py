@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:13
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0007_incomemonthlyrollup"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="incomemonthlyrollup",
+            index=models.Index(
+                fields=["year", "month"], name="income_inco_year_0dbb5f_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0008_incomemonthlyrollup_year_month_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="incomemonthlyrollup",
+            name="updated_at",
+            field=models.DateTimeField(auto_now=True),
+        ),
+    ]
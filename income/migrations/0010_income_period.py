@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:17
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+def backfill_period(apps, schema_editor):
+    Income = apps.get_model("income", "Income")
+    Income.objects.filter(date__isnull=False).update(
+        period=ExtractYear("date") * 100 + ExtractMonth("date")
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0009_incomemonthlyrollup_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="income",
+            name="period",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_period, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="income",
+            index=models.Index(
+                condition=models.Q(("is_template", False)),
+                fields=["period", "user"],
+                name="income_period_user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="income",
+            index=models.Index(
+                condition=models.Q(("is_template", False)),
+                fields=["user", "period", "currency"],
+                name="income_user_period_currency",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="income",
+            index=models.Index(
+                condition=models.Q(("is_template", False)),
+                fields=["date"],
+                name="income_date",
+            ),
+        ),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:19
+
+from django.db import migrations, models
+from django.db.models import Sum
+
+
+def backfill_unconverted(apps, schema_editor):
+    Income = apps.get_model("income", "Income")
+    IncomeMonthlyRollup = apps.get_model("income", "IncomeMonthlyRollup")
+    rows = (
+        Income.objects.filter(
+            is_template=False, period__isnull=False, exchange_rate_lkr__isnull=True
+        )
+        .exclude(currency="LKR")
+        .values("user", "period", "currency")
+        .annotate(total=Sum("take_home"))
+        .order_by()
+    )
+    for row in rows:
+        IncomeMonthlyRollup.objects.filter(
+            user_id=row["user"],
+            year=row["period"] // 100,
+            month=row["period"] % 100,
+            currency=row["currency"],
+        ).update(unconverted_take_home=row["total"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0010_income_period"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="incomemonthlyrollup",
+            name="unconverted_take_home",
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=14),
+        ),
+        migrations.CreateModel(
+            name="ExchangeRate",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[
+                            ("LKR", "Sri Lankan Rupee"),
+                            ("EUR", "Euro"),
+                            ("AUD", "Australian Dollar"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("date", models.DateField()),
+                ("rate", models.DecimalField(decimal_places=4, max_digits=12)),
+            ],
+            options={
+                "ordering": ["currency", "-date"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("currency", "date"), name="unique_exchange_rate_per_day"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_unconverted, migrations.RunPython.noop),
+    ]
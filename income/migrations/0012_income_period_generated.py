@@ -0,0 +1,53 @@
+# Generated by Django 5.2.4 on 2026-10-18 09:42
+
+from django.db import migrations, models
+from django.db.models.functions import ExtractMonth, ExtractYear
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("income", "0011_exchangerate"),
+    ]
+
+    # A regular column cannot be altered into a generated one, so the indexes
+    # over it are dropped and recreated around the swap
+    operations = [
+        migrations.RemoveIndex(
+            model_name="income",
+            name="income_period_user",
+        ),
+        migrations.RemoveIndex(
+            model_name="income",
+            name="income_user_period_currency",
+        ),
+        migrations.RemoveField(
+            model_name="income",
+            name="period",
+        ),
+        migrations.AddField(
+            model_name="income",
+            name="period",
+            field=models.GeneratedField(
+                db_persist=True,
+                expression=ExtractYear("date") * 100 + ExtractMonth("date"),
+                output_field=models.IntegerField(),
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="income",
+            index=models.Index(
+                condition=models.Q(("is_template", False)),
+                fields=["period", "user"],
+                name="income_period_user",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="income",
+            index=models.Index(
+                condition=models.Q(("is_template", False)),
+                fields=["user", "period", "currency"],
+                name="income_user_period_currency",
+            ),
+        ),
+    ]
@@ -1,5 +1,17 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, DecimalField, F, Q, Sum, Value, When
+from django.db.models.functions import Coalesce, ExtractMonth, ExtractYear
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from budget.rollups import apply_deltas
+
+from .cache import bump_summary_epoch, bump_summary_versions
 
 
 class Currency:
@@ -34,6 +46,51 @@ class Source(models.Model):
         return self.name
 
 
+class IncomeQuerySet(models.QuerySet):
+    def monthly_totals(self):
+        """Aggregate take-home, LKR take-home and payable tax per report cell.
+
+        The LKR conversion and the unpaid-tax filter run inside the database,
+        so each (user, year, month, currency) comes back as a single row.
+        """
+        amount = DecimalField(max_digits=18, decimal_places=4)
+        return (
+            self.filter(is_template=False, period__isnull=False)
+            .values("user", "period", "currency")
+            .annotate(
+                income_count=Count("id"),
+                total_take_home=Sum("take_home"),
+                total_take_home_lkr=Sum(
+                    Case(
+                        When(currency=Currency.LKR, then=F("take_home")),
+                        default=F("take_home")
+                        * Coalesce(F("exchange_rate_lkr"), Value(0)),
+                        output_field=amount,
+                    )
+                ),
+                total_unconverted_take_home=Sum(
+                    Case(
+                        When(
+                            ~Q(currency=Currency.LKR),
+                            exchange_rate_lkr__isnull=True,
+                            then=F("take_home"),
+                        ),
+                        default=Value(0),
+                        output_field=amount,
+                    )
+                ),
+                total_payable_tax=Sum(
+                    Case(
+                        When(is_tax_paid=False, then=F("tax")),
+                        default=Value(0),
+                        output_field=amount,
+                    )
+                ),
+            )
+            .order_by()
+        )
+
+
 class Income(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     source = models.ForeignKey(Source, on_delete=models.CASCADE)
@@ -47,6 +104,13 @@ class Income(models.Model):
     type = models.CharField(max_length=10, choices=Type.CHOICES, default=Type.SALARY)
     note = models.TextField(blank=True, null=True)
     is_template = models.BooleanField(default=False)
+    # YYYYMM of date, computed by the database for indexed ordering and
+    # grouping, so bulk writes and queryset updates keep it in sync too
+    period = models.GeneratedField(
+        expression=ExtractYear("date") * 100 + ExtractMonth("date"),
+        output_field=models.IntegerField(),
+        db_persist=True,
+    )
     # Earnings
     basic_amount = models.DecimalField(max_digits=10, decimal_places=2)
     allowance = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -68,5 +132,196 @@ class Income(models.Model):
     def __str__(self):
         return f"{self.source.name}({self.currency}) - {self.type}"
 
+    objects = IncomeQuerySet.as_manager()
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Income.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            IncomeMonthlyRollup.objects.apply(
+                added=[self], removed=[previous] if previous else []
+            )
+
     class Meta:
         verbose_name_plural = "Incomes"
+        # Partial indexes over non-template rows, which is what the admin
+        # changelist and the summary aggregate filter on
+        indexes = [
+            models.Index(
+                fields=["period", "user"],
+                condition=models.Q(is_template=False),
+                name="income_period_user",
+            ),
+            models.Index(
+                fields=["user", "period", "currency"],
+                condition=models.Q(is_template=False),
+                name="income_user_period_currency",
+            ),
+            models.Index(
+                fields=["date"],
+                condition=models.Q(is_template=False),
+                name="income_date",
+            ),
+        ]
+
+
+@receiver(pre_delete, sender=Income)
+def remove_from_rollup(sender, instance, **kwargs):
+    # A signal rather than delete() so incomes removed by cascading source
+    # and user deletes, and by queryset deletes, leave the rollup too. It
+    # runs before the delete, while the rollup rows of a deleted user exist.
+    IncomeMonthlyRollup.objects.apply(removed=[instance])
+
+
+class IncomeMonthlyRollupManager(models.Manager):
+    VALUE_FIELDS = (
+        "income_count",
+        "take_home",
+        "take_home_lkr",
+        "unconverted_take_home",
+        "payable_tax",
+    )
+
+    @staticmethod
+    def contribution(income):
+        """Return the rollup key and values an income adds to the report.
+
+        Foreign-currency take-home without a stored rate is kept apart in
+        ``unconverted_take_home`` so the report can convert it with the
+        ``ExchangeRate`` table instead.
+        """
+        if income.is_template or not income.date:
+            return None, None
+        take_home = Decimal(str(income.take_home))
+        unconverted = Decimal(0)
+        if income.currency == Currency.LKR:
+            take_home_lkr = take_home
+        elif income.exchange_rate_lkr is None:
+            take_home_lkr = Decimal(0)
+            unconverted = take_home
+        else:
+            take_home_lkr = take_home * Decimal(str(income.exchange_rate_lkr))
+        payable_tax = Decimal(0) if income.is_tax_paid else Decimal(str(income.tax))
+        key = (income.user_id, income.date.year, income.date.month, income.currency)
+        return key, (1, take_home, take_home_lkr, unconverted, payable_tax)
+
+    def apply(self, added=(), removed=()):
+        """Add and subtract income contributions to their monthly rollup rows."""
+        deltas = defaultdict(lambda: dict.fromkeys(self.VALUE_FIELDS, Decimal(0)))
+        for sign, incomes in ((1, added), (-1, removed)):
+            for income in incomes:
+                key, values = self.contribution(income)
+                if key is None:
+                    continue
+                for name, value in zip(self.VALUE_FIELDS, values):
+                    deltas[key][name] += sign * value
+
+        if not deltas:
+            return
+        with transaction.atomic():
+            apply_deltas(
+                self,
+                ("user_id", "year", "month", "currency"),
+                deltas,
+                updated_at=timezone.now(),
+            )
+            user_ids = {key[0] for key in deltas}
+            transaction.on_commit(lambda: bump_summary_versions(user_ids))
+
+    def rebuild(self, batch_size=2000):
+        """Recompute every rollup row from the full ``Income`` table."""
+        rows = Income.objects.monthly_totals()
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                (
+                    self.model(
+                        user_id=row["user"],
+                        year=row["period"] // 100,
+                        month=row["period"] % 100,
+                        currency=row["currency"],
+                        income_count=row["income_count"],
+                        take_home=row["total_take_home"],
+                        take_home_lkr=row["total_take_home_lkr"],
+                        unconverted_take_home=row["total_unconverted_take_home"],
+                        payable_tax=row["total_payable_tax"],
+                    )
+                    for row in rows.iterator(chunk_size=batch_size)
+                ),
+                batch_size=batch_size,
+            )
+            transaction.on_commit(bump_summary_epoch)
+        return self.count()
+
+
+class IncomeMonthlyRollup(models.Model):
+    """Precomputed take-home totals per user, month and currency."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    year = models.PositiveSmallIntegerField()
+    month = models.PositiveSmallIntegerField()
+    currency = models.CharField(max_length=6, choices=Currency.CHOICES)
+    income_count = models.IntegerField(default=0)
+    take_home = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    take_home_lkr = models.DecimalField(max_digits=18, decimal_places=4, default=0)
+    unconverted_take_home = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0
+    )
+    payable_tax = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = IncomeMonthlyRollupManager()
+
+    class Meta:
+        ordering = ["user", "year", "month", "currency"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "year", "month", "currency"],
+                name="unique_income_monthly_rollup",
+            )
+        ]
+        indexes = [models.Index(fields=["year", "month"])]
+
+    def __str__(self):
+        return f"{self.user} {self.year}-{self.month:02d} ({self.currency})"
+
+
+class ExchangeRate(models.Model):
+    """LKR value of one unit of ``currency`` from ``date`` onwards."""
+
+    currency = models.CharField(max_length=6, choices=Currency.CHOICES)
+    date = models.DateField()
+    rate = models.DecimalField(max_digits=12, decimal_places=4)
+
+    class Meta:
+        ordering = ["currency", "-date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["currency", "date"], name="unique_exchange_rate_per_day"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.currency} {self.date}: {self.rate}"
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        transaction.on_commit(exchange_rates_changed)
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        transaction.on_commit(exchange_rates_changed)
+        return result
+
+
+def exchange_rates_changed():
+    """Drop cached rates and the summaries that were converted with them."""
+    from .rates import bump_rates_version, exchange_rates
+
+    exchange_rates.clear()
+    # Rates first: a process that sees the new summary epoch then also sees
+    # the new rates version, and never caches a summary with stale rates
+    bump_rates_version()
+    bump_summary_epoch()
@@ -0,0 +1,73 @@
+from decimal import ROUND_HALF_UP, Decimal
+from typing import NamedTuple
+
+from .models import Currency, Type
+
+EPF_USER_RATE = Decimal("0.08")
+EPF_EMPLOYER_RATE = Decimal("0.12")
+ETF_EMPLOYER_RATE = Decimal("0.03")
+CENT = Decimal("0.01")
+
+PAYROLL_FIELDS = ["epf_user", "epf_employer", "etf_employer", "take_home"]
+
+
+class Payroll(NamedTuple):
+    epf_user: Decimal
+    epf_employer: Decimal
+    etf_employer: Decimal
+    take_home: Decimal
+
+
+def _decimal(value):
+    return Decimal(str(value or 0))
+
+
+def _cents(value):
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+def calculate_payroll(income):
+    """Compute EPF, ETF and take-home for ``income`` with exact Decimal math.
+
+    EPF and ETF only apply to LKR salaries and are rounded to cents before
+    take-home is derived, so the stored values always add up.
+    """
+    basic_amount = _decimal(income.basic_amount)
+    allowance = _decimal(income.allowance)
+
+    if income.type == Type.SALARY and income.currency == Currency.LKR:
+        fund_base = basic_amount
+        if income.is_allowance_for_funds:
+            fund_base += allowance
+        epf_user = _cents(fund_base * EPF_USER_RATE)
+        epf_employer = _cents(fund_base * EPF_EMPLOYER_RATE)
+        etf_employer = _cents(fund_base * ETF_EMPLOYER_RATE)
+    else:
+        epf_user = epf_employer = etf_employer = Decimal("0.00")
+
+    take_home = (
+        basic_amount
+        + allowance
+        - epf_user
+        - _decimal(income.stamp_duty)
+        - _decimal(income.other_deductions)
+    )
+    if income.is_tax_paid:
+        take_home -= _decimal(income.tax)
+
+    return Payroll(epf_user, epf_employer, etf_employer, _cents(take_home))
+
+
+def apply_payroll(incomes):
+    """Set the payroll fields on each income and return those that changed."""
+    changed = []
+    for income in incomes:
+        payroll = calculate_payroll(income)
+        if any(
+            _decimal(getattr(income, field)) != value
+            for field, value in payroll._asdict().items()
+        ):
+            for field, value in payroll._asdict().items():
+                setattr(income, field, value)
+            changed.append(income)
+    return changed
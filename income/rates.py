@@ -0,0 +1,122 @@
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from budget.cache import bump_versions, get_version
+
+from .models import Currency, ExchangeRate
+
+# Shared between processes through the cache, bumped on every rate change
+RATES_VERSION_KEY = "exchange-rates-version"
+
+
+def bump_rates_version():
+    bump_versions(RATES_VERSION_KEY)
+
+
+class ExchangeRateService:
+    """Convert amounts to LKR using the ``ExchangeRate`` time series.
+
+    Rates are looked up as the latest rate on or before a date and kept in a
+    bounded in-process LRU cache keyed by ``(currency, date)``, so converting
+    a large report costs one query per distinct currency and date. Each call
+    first compares the shared rates version with the one the LRU was filled
+    under, so rate changes made by another process are never served stale.
+    """
+
+    def __init__(self, maxsize=4096):
+        self.maxsize = maxsize
+        self._cache = OrderedDict()
+        self._version = None
+        self._lock = threading.Lock()
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def _sync(self):
+        version = get_version(RATES_VERSION_KEY)
+        with self._lock:
+            if version != self._version:
+                self._cache.clear()
+                self._version = version
+
+    def _get(self, key):
+        with self._lock:
+            if key not in self._cache:
+                return False, None
+            self._cache.move_to_end(key)
+            return True, self._cache[key]
+
+    def _set(self, key, rate):
+        with self._lock:
+            self._cache[key] = rate
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def _rate(self, currency, date):
+        if currency == Currency.LKR:
+            return Decimal(1)
+        key = (currency, date)
+        found, rate = self._get(key)
+        if not found:
+            rate = (
+                ExchangeRate.objects.filter(currency=currency, date__lte=date)
+                .order_by("-date")
+                .values_list("rate", flat=True)
+                .first()
+            )
+            self._set(key, rate)
+        return rate
+
+    def rate(self, currency, date):
+        """LKR rate for ``currency`` on ``date``, or ``None`` if unknown."""
+        self._sync()
+        return self._rate(currency, date)
+
+    def rate_series(self, currency, dates):
+        """LKR rates for ``currency`` on each of the sorted ``dates``.
+
+        Loads the rates covering the whole range in one query and walks them
+        alongside ``dates``, bypassing the LRU cache so long daily series
+        don't evict it.
+        """
+        dates = list(dates)
+        if currency == Currency.LKR:
+            return [Decimal(1)] * len(dates)
+        if not dates:
+            return []
+        first = self.rate(currency, dates[0])
+        changes = ExchangeRate.objects.filter(
+            currency=currency, date__gt=dates[0], date__lte=dates[-1]
+        ).order_by("date")
+        changes = list(changes.values_list("date", "rate"))
+        rates, current, index = [], first, 0
+        for date in dates:
+            while index < len(changes) and changes[index][0] <= date:
+                current = changes[index][1]
+                index += 1
+            rates.append(current)
+        return rates
+
+    def convert_many(self, items):
+        """Convert ``(amount, currency, date)`` items to LKR.
+
+        Returns a list aligned with ``items``; amounts without a known rate
+        convert to ``None``.
+        """
+        items = list(items)
+        self._sync()
+        rates = {}
+        for _, currency, date in items:
+            if (currency, date) not in rates:
+                rates[currency, date] = self._rate(currency, date)
+        converted = []
+        for amount, currency, date in items:
+            rate = rates[currency, date]
+            converted.append(None if rate is None else Decimal(amount) * rate)
+        return converted
+
+
+exchange_rates = ExchangeRateService()
@@ -0,0 +1,189 @@
+import calendar
+import datetime
+from decimal import Decimal
+
+from django.db.models import Q
+
+from .rates import exchange_rates
+
+MONTHS = [
+    "January",
+    "February",
+    "March",
+    "April",
+    "May",
+    "June",
+    "July",
+    "August",
+    "September",
+    "October",
+    "November",
+    "December",
+]
+
+
+class SummaryReportBuilder:
+    """Build the Summary Report structure in a single pass over grouped rows.
+
+    Year-month and user entries are keyed by dict so each row is placed in
+    O(1), and totals are kept as running sums instead of being re-summed for
+    every row. ``build()`` returns the same ``summary_data`` list the admin
+    template renders, with amounts as Decimals rounded to cents. Entries with
+    an income that has no exchange rate list its currency in
+    ``missing_rates`` and have no ``total_income``, rather than a total that
+    leaves the income out.
+    """
+
+    def __init__(self):
+        self._months = {}
+        self._users = {}
+
+    def add(
+        self,
+        year,
+        month,
+        user,
+        currency,
+        total,
+        total_lkr=None,
+        payble_tax=None,
+        missing_rate=False,
+    ):
+        month_entry = self._months.get((year, month))
+        if month_entry is None:
+            month_entry = {
+                "year": year,
+                "month": MONTHS[month - 1],
+                "users": [],
+                "total_income": Decimal(0),
+                "total_payble_tax": Decimal(0),
+            }
+            self._months[(year, month)] = month_entry
+
+        user_entry = self._users.get((year, month, user))
+        if user_entry is None:
+            user_entry = {
+                "user": user,
+                "incomes": [],
+                "total_income": Decimal(0),
+                "total_payble_tax": Decimal(0),
+            }
+            self._users[(year, month, user)] = user_entry
+            month_entry["users"].append(user_entry)
+
+        sub_income = {"currency": currency, "total": total}
+        if total_lkr is not None or missing_rate:
+            sub_income["total_lkr"] = total_lkr
+            sub_income["payble_tax"] = payble_tax or Decimal("0.00")
+        user_entry["incomes"].append(sub_income)
+
+        if missing_rate:
+            for entry in (user_entry, month_entry):
+                missing = entry.setdefault("missing_rates", [])
+                if currency not in missing:
+                    missing.append(currency)
+            income_lkr = Decimal(0)
+        else:
+            income_lkr = total if total_lkr is None else total_lkr
+        user_entry["total_income"] += income_lkr
+        month_entry["total_income"] += income_lkr
+        if payble_tax:
+            user_entry["total_payble_tax"] += payble_tax
+            month_entry["total_payble_tax"] += payble_tax
+
+    def build(self):
+        for entry in [*self._users.values(), *self._months.values()]:
+            if "missing_rates" in entry:
+                entry["total_income"] = None
+            else:
+                entry["total_income"] = round(entry["total_income"], 2)
+            entry["total_payble_tax"] = round(entry["total_payble_tax"], 2)
+        return list(self._months.values())
+
+
+def build_summary(rows):
+    """Build ``summary_data`` from ``IncomeMonthlyRollup`` rows.
+
+    Take-home stored without an exchange rate is converted with the rate in
+    effect at the end of its month, in one batched ``convert_many`` call.
+    Take-home with no rate at all is reported in ``missing_rates``.
+    """
+    rows = list(rows)
+    pending = [
+        (
+            item["unconverted_take_home"],
+            item["currency"],
+            month_end(item["year"], item["month"]),
+        )
+        for item in rows
+        if item["currency"] != "LKR" and item["unconverted_take_home"]
+    ]
+    converted = iter(exchange_rates.convert_many(pending))
+
+    builder = SummaryReportBuilder()
+    for item in rows:
+        currency = item["currency"]
+        total_lkr = payble_tax = None
+        missing_rate = False
+        if currency != "LKR":
+            total_lkr = item["take_home_lkr"]
+            if item["unconverted_take_home"]:
+                amount = next(converted)
+                if amount is None:
+                    total_lkr, missing_rate = None, True
+                else:
+                    total_lkr += amount
+            if total_lkr is not None:
+                total_lkr = round(total_lkr, 2)
+            payble_tax = round(item["payable_tax"], 2)
+        builder.add(
+            item["year"],
+            item["month"],
+            item["user__username"],
+            currency,
+            round(item["take_home"], 2),
+            total_lkr,
+            payble_tax,
+            missing_rate,
+        )
+    return builder.build()
+
+
+def month_end(year, month):
+    return datetime.date(year, month, calendar.monthrange(year, month)[1])
+
+
+def parse_period(value):
+    """Parse a ``YYYY-MM`` string into a ``(year, month)`` tuple."""
+    try:
+        year, month = (int(part) for part in value.split("-"))
+    except (AttributeError, ValueError):
+        return None
+    if not 1 <= month <= 12 or year < 1:
+        return None
+    return year, month
+
+
+def format_period(period):
+    return f"{period[0]:04d}-{period[1]:02d}"
+
+
+def shift_period(period, months):
+    index = period[0] * 12 + period[1] - 1 + months
+    return index // 12, index % 12 + 1
+
+
+def period_span(start, end):
+    return (end[0] - start[0]) * 12 + end[1] - start[1] + 1
+
+
+def period_range_filter(start, end, prefix=""):
+    """Build a keyset ``Q`` for months between ``start`` and ``end`` inclusive."""
+    year, month = f"{prefix}year", f"{prefix}month"
+    after_start = Q(**{f"{year}__gt": start[0]}) | Q(
+        **{year: start[0], f"{month}__gte": start[1]}
+    )
+    before_end = Q(**{f"{year}__lt": end[0]}) | Q(
+        **{year: end[0], f"{month}__lte": end[1]}
+    )
+    return after_start & before_end
@@ -1,3 +1,839 @@
+import csv
+import datetime
+import gzip
+import io
+import json
+from decimal import Decimal
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count, F
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from budget.admin import admin_site
+
+from .admin import IncomeAdmin
+from .cache import summary_cache_key
+from .exports import INCOME_EXPORT_FIELDS, SUMMARY_EXPORT_FIELDS
+from .management.commands.benchmark_summary import (
+    generate_rows,
+    legacy_build_summary,
+)
+from .models import (
+    Currency,
+    ExchangeRate,
+    Income,
+    IncomeMonthlyRollup,
+    Source,
+    Type,
+)
+from .payroll import Payroll, apply_payroll, calculate_payroll
+from .rates import bump_rates_version, exchange_rates
+from .summary import build_summary, parse_period, period_span, shift_period
+
+
+class IncomePeriodTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+        cls.source = Source.objects.create(name="Acme")
+        for month in range(1, 13):
+            Income.objects.create(
+                user=cls.user,
+                source=cls.source,
+                date=datetime.date(2024, month, 25),
+                basic_amount=1000,
+            )
+
+    def test_period_follows_date(self):
+        income = Income.objects.filter(is_template=False).first()
+        self.assertEqual(income.period, income.date.year * 100 + income.date.month)
+
+        income.date = datetime.date(2025, 3, 1)
+        income.save(update_fields=["date"])
+        income.refresh_from_db()
+        self.assertEqual(income.period, 202503)
+
+        Income.objects.filter(pk=income.pk).update(date=datetime.date(2025, 4, 1))
+        income.refresh_from_db()
+        self.assertEqual(income.period, 202504)
+
+    def test_changelist_ordering_uses_period_index(self):
+        incomes = Income.objects.filter(is_template=False)
+
+        # Before:
+        #   SCAN income_income USING INDEX income_date
+        #   SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)
+        #   SEARCH income_source USING INTEGER PRIMARY KEY (rowid=?)
+        #   USE TEMP B-TREE FOR ORDER BY
+        before = incomes.order_by(
+            "-date__year", "-date__month", "user__username", "source__name"
+        ).explain()
+        self.assertIn("USE TEMP B-TREE FOR ORDER BY", before)
+
+        # After:
+        #   SCAN income_income USING INDEX income_period_user
+        #   SEARCH auth_user USING INTEGER PRIMARY KEY (rowid=?)
+        #   SEARCH income_source USING INTEGER PRIMARY KEY (rowid=?)
+        #   USE TEMP B-TREE FOR RIGHT PART OF ORDER BY
+        after = incomes.order_by(*IncomeAdmin.ordering).explain()
+        self.assertIn("USING INDEX income_period_user", after)
+        self.assertNotIn("USE TEMP B-TREE FOR ORDER BY", after)
+
+    def test_summary_grouping_uses_period_index(self):
+        incomes = Income.objects.filter(is_template=False)
+
+        # Before:
+        #   SCAN income_income USING INDEX income_user_period_currency
+        #   USE TEMP B-TREE FOR GROUP BY
+        before = (
+            incomes.values("user", "date__year", "date__month", "currency")
+            .annotate(count=Count("id"))
+            .order_by()
+            .explain()
+        )
+        self.assertIn("USE TEMP B-TREE FOR GROUP BY", before)
+
+        # After:
+        #   SCAN income_income USING INDEX income_user_period_currency
+        after = Income.objects.monthly_totals().explain()
+        self.assertIn("USING INDEX income_user_period_currency", after)
+        self.assertNotIn("TEMP B-TREE", after)
+
+
+class IncomeRollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+        cls.source = Source.objects.create(name="Acme")
+
+    def create_income(self, **fields):
+        fields = {
+            "user": self.user,
+            "source": self.source,
+            "date": datetime.date(2024, 1, 25),
+            "basic_amount": 100,
+            "take_home": 100,
+            **fields,
+        }
+        return Income.objects.create(**fields)
+
+    def rollup(self, **lookup):
+        return IncomeMonthlyRollup.objects.values(
+            "income_count", "take_home", "take_home_lkr", "unconverted_take_home"
+        ).get(user=self.user, **lookup)
+
+    def test_writes_apply_deltas(self):
+        income = self.create_income(
+            currency=Currency.EUR, exchange_rate_lkr=Decimal("300"), take_home=50
+        )
+        self.create_income(currency=Currency.EUR, take_home=25)
+        self.create_income(is_template=True, take_home=1000)
+        self.assertEqual(
+            self.rollup(year=2024, month=1, currency=Currency.EUR),
+            {
+                "income_count": 2,
+                "take_home": Decimal("75"),
+                "take_home_lkr": Decimal("15000"),
+                "unconverted_take_home": Decimal("25"),
+            },
+        )
+        self.assertFalse(IncomeMonthlyRollup.objects.filter(currency="LKR").exists())
+
+        # Moving an income to another month moves its contribution
+        income.date = datetime.date(2024, 2, 1)
+        income.save()
+        self.assertEqual(
+            self.rollup(year=2024, month=1, currency=Currency.EUR)["income_count"], 1
+        )
+        self.assertEqual(
+            self.rollup(year=2024, month=2, currency=Currency.EUR)["take_home"],
+            Decimal("50"),
+        )
+
+        income.delete()
+        self.assertEqual(
+            self.rollup(year=2024, month=2, currency=Currency.EUR)["income_count"], 0
+        )
+
+    def test_cascading_deletes_leave_the_rollup(self):
+        for take_home in (100, 50):
+            self.create_income(currency=Currency.EUR, take_home=take_home)
+        key = summary_cache_key(self.user.pk, (2024, 1), (2024, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.source.delete()
+
+        self.assertEqual(
+            self.rollup(year=2024, month=1, currency=Currency.EUR),
+            {
+                "income_count": 0,
+                "take_home": Decimal("0"),
+                "take_home_lkr": Decimal("0"),
+                "unconverted_take_home": Decimal("0"),
+            },
+        )
+        self.assertNotEqual(summary_cache_key(self.user.pk, (2024, 1), (2024, 1)), key)
+
+    def test_rebuild_matches_incremental_rollup(self):
+        for month in (1, 2):
+            self.create_income(date=datetime.date(2024, month, 1), take_home=10)
+            self.create_income(
+                date=datetime.date(2024, month, 1),
+                take_home=20,
+                tax=Decimal("3.50"),
+                is_tax_paid=False,
+            )
+            self.create_income(
+                date=datetime.date(2024, month, 2),
+                currency=Currency.AUD,
+                exchange_rate_lkr=Decimal("200"),
+                take_home=5,
+                tax=2,
+                is_tax_paid=False,
+            )
+            # Without a stored rate the take-home stays unconverted
+            self.create_income(
+                date=datetime.date(2024, month, 3),
+                currency=Currency.AUD,
+                take_home=Decimal("7.25"),
+            )
+        Income.objects.filter(date__month=2, take_home=10).delete()
+        fields = [
+            "user",
+            "year",
+            "month",
+            "currency",
+            "income_count",
+            "take_home",
+            "take_home_lkr",
+            "unconverted_take_home",
+            "payable_tax",
+        ]
+        rollups = IncomeMonthlyRollup.objects.order_by("year", "month", "currency")
+        incremental = list(rollups.filter(income_count__gt=0).values(*fields))
+        self.assertEqual(
+            incremental[1],
+            {
+                "user": self.user.pk,
+                "year": 2024,
+                "month": 1,
+                "currency": Currency.LKR,
+                "income_count": 2,
+                "take_home": Decimal("30"),
+                "take_home_lkr": Decimal("30"),
+                "unconverted_take_home": Decimal("0"),
+                "payable_tax": Decimal("3.50"),
+            },
+        )
+
+        IncomeMonthlyRollup.objects.rebuild()
+        self.assertEqual(list(rollups.values(*fields)), incremental)
+
+
+class SummaryCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.alice = User.objects.create_user("alice")
+        cls.bob = User.objects.create_user("bob")
+        cls.source = Source.objects.create(name="Acme")
+
+    def setUp(self):
+        cache.clear()
+
+    def create_income(self, user, take_home=100):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Income.objects.create(
+                user=user,
+                source=self.source,
+                date=datetime.date(2024, 1, 25),
+                basic_amount=take_home,
+                take_home=take_home,
+            )
+
+    def keys(self):
+        period = (2024, 1)
+        return {
+            user: summary_cache_key(user, period, period)
+            for user in (None, self.alice.pk, self.bob.pk)
+        }
+
+    def test_writes_only_invalidate_their_user(self):
+        before = self.keys()
+        self.create_income(self.alice)
+        after = self.keys()
+        self.assertNotEqual(after[self.alice.pk], before[self.alice.pk])
+        self.assertNotEqual(after[None], before[None])
+        self.assertEqual(after[self.bob.pk], before[self.bob.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            IncomeMonthlyRollup.objects.rebuild()
+        rebuilt = self.keys()
+        for user, key in after.items():
+            self.assertNotEqual(rebuilt[user], key)
+
+    def test_report_is_served_from_the_cache(self):
+        self.create_income(self.alice)
+        self.client.force_login(self.admin)
+        url = reverse("admin:custom-summary")
+        params = {"from": "2024-01", "to": "2024-01", "user": "alice"}
+        self.client.get(url, params)
+        # Session, user, the user list and older months; the summary itself
+        # is cached
+        with self.assertNumQueries(4):
+            response = self.client.get(url, params)
+        self.assertEqual(response.context["summary_data"][0]["total_income"], 100)
+
+        self.create_income(self.alice, take_home=50)
+        response = self.client.get(url, params)
+        self.assertEqual(response.context["summary_data"][0]["total_income"], 150)
+
+    def test_unknown_user_is_not_found(self):
+        self.client.force_login(self.admin)
+        for name in ("custom-summary", "custom-summary-api", "custom-summary-export"):
+            response = self.client.get(reverse(f"admin:{name}"), {"user": "nobody"})
+            self.assertEqual(response.status_code, 404)
+
+
+class SummaryWindowTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.source = Source.objects.create(name="Acme")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:custom-summary")
+
+    def create_income(self, year, month):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Income.objects.create(
+                user=self.admin,
+                source=self.source,
+                date=datetime.date(year, month, 25),
+                basic_amount=100,
+                take_home=100,
+            )
+
+    def window(self, params=None):
+        response = self.client.get(self.url, params or {})
+        self.assertEqual(response.status_code, 200)
+        return response.context["period_from"], response.context["period_to"]
+
+    def test_period_helpers(self):
+        self.assertEqual(parse_period("2024-03"), (2024, 3))
+        for value in (None, "", "2024", "2024-13", "2024-00", "0000-01", "x-y"):
+            self.assertIsNone(parse_period(value))
+        self.assertEqual(shift_period((2024, 1), -1), (2023, 12))
+        self.assertEqual(shift_period((2024, 12), 1), (2025, 1))
+        self.assertEqual(shift_period((2024, 3), -14), (2023, 1))
+        self.assertEqual(period_span((2024, 1), (2024, 1)), 1)
+        self.assertEqual(period_span((2023, 11), (2024, 2)), 4)
+
+    def test_default_window_is_the_trailing_twelve_months(self):
+        today = timezone.localdate()
+        end = (today.year, today.month)
+        expected = ("%04d-%02d" % shift_period(end, -11), "%04d-%02d" % end)
+        self.assertEqual(self.window(), expected)
+        self.assertEqual(self.window({"from": "bad", "to": "2024-13"}), expected)
+
+    def test_invalid_bound_falls_back_to_the_default(self):
+        self.assertEqual(
+            self.window({"from": "bad", "to": "2024-06"}), ("2023-07", "2024-06")
+        )
+
+    def test_swapped_bounds(self):
+        self.assertEqual(
+            self.window({"from": "2024-06", "to": "2024-01"}), ("2024-01", "2024-06")
+        )
+
+    def test_navigation_links(self):
+        params = {"from": "2024-01", "to": "2024-03"}
+        response = self.client.get(self.url, params)
+        self.assertIsNone(response.context["older_url"])
+        self.assertEqual(response.context["newer_url"], "?from=2024-04&to=2024-06")
+        self.assertNotContains(response, "Older")
+
+        self.create_income(2023, 12)
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.context["older_url"], "?from=2023-10&to=2023-12")
+        self.assertContains(response, "Older")
+
+        today = timezone.localdate()
+        current = "%04d-%02d" % (today.year, today.month)
+        response = self.client.get(self.url, {"from": "2024-01", "to": current})
+        self.assertIsNone(response.context["newer_url"])
+
+
+class ExchangeRateVersionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.source = Source.objects.create(name="Acme")
+        ExchangeRate.objects.create(
+            currency=Currency.EUR, date=datetime.date(2024, 1, 1), rate=300
+        )
+
+    def setUp(self):
+        cache.clear()
+        exchange_rates.clear()
+
+    def test_rate_change_invalidates_summary_api(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Income.objects.create(
+                user=self.admin,
+                source=self.source,
+                date=datetime.date(2024, 1, 25),
+                currency=Currency.EUR,
+                basic_amount=10,
+                take_home=10,
+            )
+        self.client.force_login(self.admin)
+        url = reverse("admin:custom-summary-api")
+        params = {"from": "2024-01", "to": "2024-01"}
+        response = self.client.get(url, params)
+        etag = response["ETag"]
+        self.assertEqual(
+            self.client.get(url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.create(
+                currency=Currency.EUR, date=datetime.date(2024, 1, 15), rate=310
+            )
+        response = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        results = response.json()["results"]
+        self.assertEqual(results[0]["total_income"], "3100.00")
+
+    def test_missing_rates_are_reported_instead_of_a_partial_total(self):
+        for currency, take_home in ((Currency.LKR, 100), (Currency.AUD, 10)):
+            with self.captureOnCommitCallbacks(execute=True):
+                Income.objects.create(
+                    user=self.admin,
+                    source=self.source,
+                    date=datetime.date(2024, 1, 25),
+                    currency=currency,
+                    basic_amount=take_home,
+                    take_home=take_home,
+                )
+        self.client.force_login(self.admin)
+        params = {"from": "2024-01", "to": "2024-01"}
+        (month,) = self.client.get(reverse("admin:custom-summary-api"), params).json()[
+            "results"
+        ]
+        self.assertIsNone(month["total_income"])
+        self.assertEqual(month["missing_rates"], ["AUD"])
+        self.assertIsNone(month["users"][0]["total_income"])
+        response = self.client.get(reverse("admin:custom-summary"), params)
+        self.assertContains(response, "No exchange rate for AUD")
+
+    def test_rates_follow_changes_from_other_processes(self):
+        january = datetime.date(2024, 1, 31)
+        self.assertEqual(exchange_rates.rate(Currency.EUR, january), 300)
+        # A raw update stands in for a write made by another process, which
+        # only shares the rates version through the cache
+        ExchangeRate.objects.update(rate=320)
+        self.assertEqual(exchange_rates.rate(Currency.EUR, january), 300)
+        bump_rates_version()
+        self.assertEqual(exchange_rates.rate(Currency.EUR, january), 320)
+        self.assertEqual(
+            exchange_rates.convert_many([(1, Currency.EUR, january)]), [320]
+        )
+
+
+class IncomeExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.source = Source.objects.create(name="Acme")
+        cls.incomes = [
+            Income.objects.create(
+                user=cls.admin,
+                source=cls.source,
+                date=datetime.date(2024, month, 25),
+                basic_amount=100 * month,
+                take_home=100 * month,
+            )
+            for month in (1, 2)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def read(self, response):
+        return b"".join(response.streaming_content)
+
+    def test_exports_require_view_permission(self):
+        staff = User.objects.create_user("staff", is_staff=True)
+        staff.user_permissions.add(Permission.objects.get(codename="change_source"))
+        self.client.force_login(staff)
+        for name in (
+            "custom-summary-api",
+            "custom-summary-export",
+            "income-export",
+        ):
+            response = self.client.get(reverse(f"admin:{name}"))
+            self.assertEqual(response.status_code, 403, name)
+
+    def test_summary_export_streams_csv_and_jsonl(self):
+        self.client.force_login(self.admin)
+        url = reverse("admin:custom-summary-export")
+        params = {"from": "2024-01", "to": "2024-02"}
+        rows = list(
+            csv.reader(io.StringIO(self.read(self.client.get(url, params)).decode()))
+        )
+        self.assertEqual(rows[0], SUMMARY_EXPORT_FIELDS)
+        self.assertEqual([row[2] for row in rows[1:]], ["1", "2"])
+
+        response = self.client.get(url, {**params, "format": "jsonl", "gzip": "1"})
+        self.assertEqual(response["Content-Type"], "application/gzip")
+        lines = gzip.decompress(self.read(response)).decode().splitlines()
+        self.assertEqual([json.loads(line)["month"] for line in lines], [1, 2])
+
+    def test_admin_actions_offer_gzip(self):
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse("admin:income_income_changelist"),
+            {
+                "action": "export_as_csv_gzip",
+                "_selected_action": [income.pk for income in self.incomes],
+            },
+        )
+        self.assertIn('filename="incomes.csv.gz"', response["Content-Disposition"])
+        rows = list(
+            csv.reader(io.StringIO(gzip.decompress(self.read(response)).decode()))
+        )
+        self.assertEqual(rows[0], INCOME_EXPORT_FIELDS)
+        self.assertEqual(len(rows), 3)
+
+
+class SummaryApiTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.source = Source.objects.create(name="Acme")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:custom-summary-api")
+        self.params = {"from": "2024-01", "to": "2024-02"}
+
+    def create_income(self, month, take_home=100):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Income.objects.create(
+                user=self.admin,
+                source=self.source,
+                date=datetime.date(2024, month, 25),
+                basic_amount=take_home,
+                take_home=take_home,
+            )
+
+    def test_conditional_get(self):
+        self.create_income(1)
+        response = self.client.get(self.url, self.params)
+        self.assertEqual(response.status_code, 200)
+        etag, last_modified = response["ETag"], response["Last-Modified"]
+
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(
+            self.url, self.params, HTTP_IF_MODIFIED_SINCE=last_modified
+        )
+        self.assertEqual(response.status_code, 304)
+
+        self.create_income(2)
+        response = self.client.get(self.url, self.params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [row["month"] for row in response.json()["results"]],
+            ["January", "February"],
+        )
+
+    def test_etag_depends_on_window_and_fields(self):
+        self.create_income(1)
+        etag = self.client.get(self.url, self.params)["ETag"]
+        for params in (
+            {**self.params, "from": "2024-02"},
+            {**self.params, "fields": "year,month"},
+        ):
+            response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_field_selection(self):
+        self.create_income(1)
+        response = self.client.get(
+            self.url, {**self.params, "fields": "month,unknown,total_income"}
+        )
+        self.assertEqual(
+            response.json()["results"], [{"month": "January", "total_income": "100.00"}]
+        )
+
+    def test_amounts_are_decimal_strings(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Income.objects.create(
+                user=self.admin,
+                source=self.source,
+                date=datetime.date(2024, 1, 25),
+                currency=Currency.EUR,
+                exchange_rate_lkr=Decimal("300"),
+                basic_amount=10,
+                take_home=10,
+                tax=5,
+                is_tax_paid=False,
+            )
+        self.create_income(1)
+        (month,) = self.client.get(self.url, self.params).json()["results"]
+        self.assertEqual(month["total_income"], "3100.00")
+        self.assertEqual(month["total_payble_tax"], "5.00")
+        self.assertEqual(
+            month["users"][0]["incomes"],
+            [
+                {
+                    "currency": "EUR",
+                    "total": "10.00",
+                    "total_lkr": "3000.00",
+                    "payble_tax": "5.00",
+                },
+                {"currency": "LKR", "total": "100.00"},
+            ],
+        )
+
+    def test_gzip(self):
+        for month in (1, 2):
+            self.create_income(month)
+        response = self.client.get(self.url, self.params, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        results = json.loads(gzip.decompress(response.content))["results"]
+        self.assertEqual(len(results), 2)
+
+
+class GenerateFromTemplateTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.source = Source.objects.create(name="Acme")
+
+    def create_template(self, take_home, currency=Currency.LKR):
+        return Income.objects.create(
+            user=self.admin,
+            source=self.source,
+            currency=currency,
+            exchange_rate_lkr=None if currency == Currency.LKR else 300,
+            date=datetime.date(2024, 1, 1),
+            basic_amount=take_home,
+            take_home=take_home,
+            is_template=True,
+        )
+
+    def generate(self, templates):
+        admin = IncomeAdmin(Income, admin_site)
+        return admin._generate_from_templates(templates, (2024, 1), (2024, 3), 25)
+
+    def test_months_are_filled_once(self):
+        templates = [self.create_template(100), self.create_template(200)]
+        Income.objects.create(
+            user=self.admin,
+            source=self.source,
+            date=datetime.date(2024, 2, 25),
+            basic_amount=100,
+            take_home=100,
+        )
+        self.assertEqual(self.generate(templates), (2, 4))
+        periods = (
+            Income.objects.filter(is_template=False)
+            .values("period")
+            .annotate(count=Count("id"))
+            .values_list("period", "count")
+            .order_by("period")
+        )
+        self.assertEqual(list(periods), [(202401, 1), (202402, 1), (202403, 1)])
+
+    def test_templates_in_other_currencies_are_generated(self):
+        templates = [self.create_template(100), self.create_template(10, "EUR")]
+        self.assertEqual(self.generate(templates), (6, 0))
+        self.assertEqual(
+            Income.objects.filter(is_template=False, currency="EUR").count(), 3
+        )
+        # A second run finds every month filled in both currencies
+        self.assertEqual(self.generate(templates), (0, 6))
+
+
+class PayrollTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+        cls.source = Source.objects.create(name="Acme")
+
+    def income(self, **fields):
+        fields = {
+            "user": self.user,
+            "source": self.source,
+            "date": datetime.date(2024, 1, 25),
+            **fields,
+        }
+        return Income(**fields)
+
+    def test_funds_are_rounded_half_up_to_cents(self):
+        payroll = calculate_payroll(self.income(basic_amount=Decimal("10000.50")))
+        self.assertEqual(
+            payroll,
+            Payroll(
+                epf_user=Decimal("800.04"),
+                epf_employer=Decimal("1200.06"),
+                # 300.015, which float math rounds down
+                etf_employer=Decimal("300.02"),
+                take_home=Decimal("9200.46"),
+            ),
+        )
+
+    def test_allowance_and_deductions(self):
+        payroll = calculate_payroll(
+            self.income(
+                basic_amount=Decimal("1000.00"),
+                allowance=Decimal("500.00"),
+                is_allowance_for_funds=True,
+                stamp_duty=Decimal("25.00"),
+                other_deductions=Decimal("10.00"),
+                tax=Decimal("40.00"),
+                is_tax_paid=True,
+            )
+        )
+        self.assertEqual(payroll.epf_user, Decimal("120.00"))
+        self.assertEqual(payroll.take_home, Decimal("1305.00"))
+
+    def test_funds_only_apply_to_lkr_salaries(self):
+        for fields in ({"type": Type.BONUS}, {"currency": Currency.EUR}):
+            payroll = calculate_payroll(
+                self.income(basic_amount=Decimal("1000.00"), **fields)
+            )
+            self.assertEqual(payroll.epf_user + payroll.etf_employer, 0)
+            self.assertEqual(payroll.take_home, Decimal("1000.00"))
+
+    def test_recalculate_incomes_fixes_drifted_rows(self):
+        incomes = [
+            self.income(
+                basic_amount=Decimal(1000 * month), date=datetime.date(2024, month, 25)
+            )
+            for month in (1, 2, 3)
+        ]
+        with self.captureOnCommitCallbacks(execute=True):
+            for income in incomes:
+                apply_payroll([income])
+                income.save()
+        # Written behind the payroll engine's back
+        Income.objects.filter(pk__in=[incomes[0].pk, incomes[2].pk]).update(
+            epf_user=0, take_home=F("take_home") + Decimal("0.01")
+        )
+        IncomeMonthlyRollup.objects.rebuild()
+
+        out = io.StringIO()
+        call_command("recalculate_incomes", "--dry-run", stdout=out)
+        self.assertIn("would fix 2", out.getvalue())
+        self.assertEqual(Income.objects.filter(epf_user=0).count(), 2)
+
+        out = io.StringIO()
+        call_command("recalculate_incomes", "--chunk-size", "2", stdout=out)
+        self.assertIn("Processed 3 incomes, fixed 2", out.getvalue())
+        self.assertIn("rows/s", out.getvalue())
+        self.assertEqual(
+            list(Income.objects.order_by("date").values_list("epf_user", "take_home")),
+            [
+                (Decimal("80.00"), Decimal("920.00")),
+                (Decimal("160.00"), Decimal("1840.00")),
+                (Decimal("240.00"), Decimal("2760.00")),
+            ],
+        )
+        self.assertEqual(
+            list(
+                IncomeMonthlyRollup.objects.order_by("month").values_list(
+                    "take_home", flat=True
+                )
+            ),
+            [Decimal("920.00"), Decimal("1840.00"), Decimal("2760.00")],
+        )
+
+
+class IncomeChangelistTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.sources = [Source.objects.create(name=f"Source {i}") for i in range(3)]
+        cls.template = Income.objects.create(
+            user=cls.admin,
+            source=cls.sources[0],
+            date=datetime.date(2024, 1, 1),
+            basic_amount=1,
+            is_template=True,
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:income_income_changelist")
+
+    def create_incomes(self, count):
+        offset = User.objects.count()
+        users = [User.objects.create_user(f"user{offset + i}") for i in range(count)]
+        Income.objects.bulk_create(
+            Income(
+                user=user,
+                source=self.sources[i % len(self.sources)],
+                date=datetime.date(2024, 1, 25),
+                basic_amount=100,
+            )
+            for i, user in enumerate(users)
+        )
+
+    def page_queries(self):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_rows(self):
+        self.create_incomes(2)
+        response, few = self.page_queries()
+        self.assertEqual(response.context["cl"].result_count, 2)
+        self.create_incomes(40)
+        response, many = self.page_queries()
+        self.assertEqual(response.context["cl"].result_count, 42)
+        self.assertEqual(many, few)
+
+    def test_templates_are_hidden_without_a_redirect(self):
+        self.create_incomes(1)
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(self.template, response.context["cl"].result_list)
+        response = self.client.get(self.url, {"is_template__exact": "1"})
+        self.assertEqual(list(response.context["cl"].result_list), [self.template])
+
+    def test_page_count_is_cached(self):
+        self.create_incomes(2)
+        _, uncached = self.page_queries()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(self.url)
+        self.assertEqual(len(queries), uncached - 1)
+
+
+class SummaryBuilderTests(TestCase):
+    def setUp(self):
+        cache.clear()
 
-# Create your tests here.
+    def test_matches_the_legacy_builder(self):
+        rows = generate_rows(360, users=4)
+        self.assertEqual(
+            {(row["user__username"], row["currency"]) for row in rows},
+            {(f"user{u:02d}", c) for u in range(4) for c in ("AUD", "EUR", "LKR")},
+        )
+        self.assertEqual(build_summary(rows), legacy_build_summary(rows))
@@ -1,18 +1,22 @@
-from django.contrib import admin
-from django.db.models import Sum
+import datetime
+import io
+
+from django.contrib import admin, messages
+from django.contrib.auth.models import User
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.http import JsonResponse
+from django.shortcuts import redirect, render
+from django.urls import path, reverse
+from django.utils import timezone
 
 from budget.admin import admin_site
 
-from .models import Bank, Transaction
-
-# def fetch_currency_exchange_rate_live
-
-
-EXCHANGE_RATES = {
-    "LKR": 1,
-    "EUR": 344.9,  # example rate
-    "AUD": 191.7,  # example rate
-}
+from .forms import TransactionImportForm
+from .importers import StatementImportError, TransactionImporter
+from .models import Bank, BankBalance, Transaction
+from .series import DAY, MONTH, RESOLUTIONS, balance_series, parse_date
+from .summary import balance_summary, get_cached_summary, transaction_summary
 
 
 class BankAdmin(admin.ModelAdmin):
@@ -26,33 +30,164 @@ class TransactionAdmin(admin.ModelAdmin):
     list_filter = ("currency", "type", "date", "bank")
     change_list_template = "admin/investment/transaction_changelist.html"
 
+    def get_urls(self):
+        urls = super().get_urls()
+        custom_urls = [
+            path(
+                "import/",
+                self.admin_site.admin_view(self.import_view),
+                name="investment-transaction-import",
+            ),
+            path(
+                "balance-history/",
+                self.admin_site.admin_view(self.balance_history_view),
+                name="investment-balance-history",
+            ),
+            path(
+                "balance-history/api/",
+                self.admin_site.admin_view(self.balance_history_api_view),
+                name="investment-balance-history-api",
+            ),
+        ]
+        return custom_urls + urls
+
+    def import_view(self, request):
+        if not self.has_add_permission(request):
+            raise PermissionDenied
+        if request.method == "POST":
+            form = TransactionImportForm(request.POST, request.FILES)
+            if form.is_valid():
+                importer = TransactionImporter(
+                    form.cleaned_data["user"],
+                    form.cleaned_data["bank"],
+                    currency=form.cleaned_data["currency"] or None,
+                    date_format=form.cleaned_data["date_format"],
+                )
+                # Read the upload as a text stream instead of loading it whole
+                lines = io.TextIOWrapper(
+                    form.cleaned_data["file"].file, encoding="utf-8-sig", newline=""
+                )
+                try:
+                    result = importer.run(lines)
+                except StatementImportError as exc:
+                    form.add_error("file", str(exc))
+                else:
+                    self.message_user(
+                        request,
+                        f"Imported {result.created} transactions, skipped "
+                        f"{result.skipped} already imported rows.",
+                        level=messages.SUCCESS,
+                    )
+                    return redirect("..")
+        else:
+            form = TransactionImportForm()
+
+        return render(
+            request,
+            "admin/investment/transaction_import_form.html",
+            {
+                "form": form,
+                "title": "Import Bank Statement",
+                "opts": self.model._meta,
+            },
+        )
+
+    def get_balance_history_params(self, request):
+        """Resolution, date range and filtered transactions of a request.
+
+        Daily history defaults to the trailing year; monthly history covers
+        every transaction unless ``from`` is given.
+        """
+        resolution = request.GET.get("resolution")
+        if resolution not in RESOLUTIONS:
+            resolution = MONTH
+        start = parse_date(request.GET.get("from"))
+        end = parse_date(request.GET.get("to"))
+        if start is None and resolution == DAY:
+            start = (end or timezone.localdate()) - datetime.timedelta(days=365)
+
+        transactions = Transaction.objects.all()
+        if request.GET.get("user"):
+            transactions = transactions.filter(user__username=request.GET["user"])
+        if request.GET.get("bank", "").isdigit():
+            transactions = transactions.filter(bank_id=request.GET["bank"])
+        return resolution, start, end, transactions
+
+    def balance_history_view(self, request):
+        if not request.user.has_perm("investment.view_transaction"):
+            raise PermissionDenied
+        resolution, start, end, _ = self.get_balance_history_params(request)
+        return render(
+            request,
+            "admin/investment/balance_history.html",
+            {
+                **self.admin_site.each_context(request),
+                "title": "Balance History",
+                "opts": self.model._meta,
+                "api_url": reverse("admin:investment-balance-history-api"),
+                "query": request.GET.urlencode(),
+                "resolutions": RESOLUTIONS,
+                "resolution": resolution,
+                "period_from": start.isoformat() if start else "",
+                "period_to": end.isoformat() if end else "",
+                "usernames": User.objects.order_by("username").values_list(
+                    "username", flat=True
+                ),
+                "selected_user": request.GET.get("user", ""),
+                "banks": Bank.objects.order_by("name"),
+                "selected_bank": request.GET.get("bank", ""),
+            },
+        )
+
+    def balance_history_api_view(self, request):
+        if not request.user.has_perm("investment.view_transaction"):
+            raise PermissionDenied
+        resolution, start, end, transactions = self.get_balance_history_params(request)
+        return JsonResponse(
+            {
+                "resolution": resolution,
+                "from": start,
+                "to": end,
+                "series": balance_series(transactions, resolution, start, end),
+            }
+        )
+
+    def delete_queryset(self, request, queryset):
+        with transaction.atomic():
+            BankBalance.objects.apply(removed=queryset)
+            super().delete_queryset(request, queryset)
+
     def changelist_view(self, request, extra_context=None):
         response = super().changelist_view(request, extra_context=extra_context)
 
         try:
-            queryset = response.context_data["cl"].queryset
+            cl = response.context_data["cl"]
         except (AttributeError, KeyError):
             return response
 
-        # Calculate summary per user & bank
-        summary_data = (
-            queryset.values("user__username", "bank__name", "currency")
-            .annotate(total_amount=Sum("amount"))
-            .order_by("user__username", "bank__name")
-        )
+        # One aggregate query per distinct filter set, cached until any
+        # transaction changes; paging and sorting reuse the cached result
+        today = timezone.localdate()
 
-        # Convert to LKR
-        for row in summary_data:
-            currency = row["currency"]
-            rate = EXCHANGE_RATES.get(currency, 1)
-            row["amount_lkr"] = float(row["total_amount"] or 0) * rate
+        def build():
+            if cl.has_active_filters or cl.query:
+                return transaction_summary(cl.queryset, today)
+            # Unfiltered view: read the maintained balance snapshots
+            balances = BankBalance.objects.filter(transaction_count__gt=0)
+            return balance_summary(balances, today)
 
-        # Calculate grand total in LKR
-        grand_total_lkr = sum(row["amount_lkr"] for row in summary_data)
+        summary_data, grand_total_lkr, missing_rates = get_cached_summary(
+            request.GET, today, build
+        )
 
         extra_context = extra_context or {}
+        extra_context["import_url"] = reverse("admin:investment-transaction-import")
+        extra_context["balance_history_url"] = reverse(
+            "admin:investment-balance-history"
+        )
         extra_context["summary_data"] = summary_data
         extra_context["grand_total_lkr"] = grand_total_lkr
+        extra_context["missing_rates"] = missing_rates
 
         response.context_data.update(extra_context)
         return response
@@ -0,0 +1,21 @@
+from django import forms
+from django.contrib.auth.models import User
+
+from income.models import Currency
+
+from .importers import ISO_DATE_FORMAT
+from .models import Bank
+
+
+class TransactionImportForm(forms.Form):
+    file = forms.FileField(help_text="CSV with date, amount and optional note, type")
+    user = forms.ModelChoiceField(queryset=User.objects.all())
+    bank = forms.ModelChoiceField(queryset=Bank.objects.all())
+    currency = forms.ChoiceField(
+        choices=[("", "Bank currency")] + Currency.CHOICES,
+        required=False,
+    )
+    date_format = forms.CharField(
+        initial=ISO_DATE_FORMAT,
+        help_text="strptime format of the date column",
+    )
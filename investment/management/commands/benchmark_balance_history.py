@@ -0,0 +1,104 @@
+import datetime
+import random
+import time
+from collections import defaultdict
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from investment.importers import StatementRow, insert_rows
+from investment.models import Bank, Transaction, TransactionType
+from investment.series import DAY, MONTH, balance_series
+
+
+def python_balances(queryset, resolution):
+    """Running balances computed in Python over every transaction row."""
+    balances = defaultdict(Decimal)
+    series = defaultdict(dict)
+    rows = queryset.order_by("date").values_list(
+        "user__username", "bank__name", "currency", "date", "amount"
+    )
+    for username, bank, currency, date, amount in rows.iterator(chunk_size=10000):
+        key = (username, bank, currency)
+        balances[key] += amount
+        bucket = date if resolution == DAY else date.replace(day=1)
+        series[key][bucket] = balances[key]
+    return series
+
+
+def generate_transactions(count, users, banks, days, seed=0):
+    rng = random.Random(seed)
+    start = datetime.date.today() - datetime.timedelta(days=days)
+    for i in range(count):
+        amount = Decimal(rng.randint(-50000, 100000)) / 100
+        yield StatementRow(
+            user_id=rng.choice(users),
+            bank_id=rng.choice(banks),
+            currency="LKR",
+            date=start + datetime.timedelta(days=rng.randrange(days)),
+            amount=amount,
+            note=None,
+            type=TransactionType.WITHDRAWAL if amount < 0 else TransactionType.DEPOSIT,
+            import_hash=f"benchmark-{i}",
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare running balances computed in Python with the window function "
+        "series. Synthetic transactions are rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--transactions", type=int, default=1000000)
+        parser.add_argument("--users", type=int, default=3)
+        parser.add_argument("--banks", type=int, default=4)
+        parser.add_argument("--days", type=int, default=3650)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            users = [
+                User.objects.create(username=f"benchmark-user-{i}").pk
+                for i in range(options["users"])
+            ]
+            banks = [
+                Bank.objects.create(name=f"Benchmark Bank {i}").pk
+                for i in range(options["banks"])
+            ]
+            start = time.perf_counter()
+            rows = list(
+                generate_transactions(
+                    options["transactions"], users, banks, options["days"]
+                )
+            )
+            for offset in range(0, len(rows), 10000):
+                insert_rows(rows[offset : offset + 10000])
+            self.stdout.write(
+                f"Inserted {len(rows)} transactions in "
+                f"{time.perf_counter() - start:.1f}s"
+            )
+
+            transactions = Transaction.objects.filter(user__in=users)
+            self.stdout.write(
+                f"{'resolution':>10} {'python (s)':>12} {'window (s)':>12}"
+            )
+            for resolution in (MONTH, DAY):
+                start = time.perf_counter()
+                expected = python_balances(transactions, resolution)
+                python_elapsed = time.perf_counter() - start
+
+                start = time.perf_counter()
+                series = balance_series(transactions, resolution)
+                window_elapsed = time.perf_counter() - start
+
+                for item in series:
+                    key = (item["user"], item["bank"], item["currency"])
+                    balances = list(expected[key].values())
+                    if [p["balance"] for p in item["points"]] != balances:
+                        self.stderr.write(f"{resolution} balances differ for {key}")
+                self.stdout.write(
+                    f"{resolution:>10} {python_elapsed:>12.2f} {window_elapsed:>12.2f}"
+                )
+            transaction.set_rollback(True)
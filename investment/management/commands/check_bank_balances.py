@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from investment.models import BankBalance
+
+
+def cents(value):
+    # SQLite sums decimals as floats, so compare at the stored precision
+    return Decimal(str(value)).quantize(Decimal("0.01"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare BankBalance snapshots with balances recomputed from all "
+        "transactions, and rebuild them with --fix."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Rebuild the snapshots from the raw transactions.",
+        )
+
+    def handle(self, *args, **options):
+        expected = BankBalance.objects.expected()
+        stored = {
+            (row.user_id, row.bank_id, row.currency): (
+                row.transaction_count,
+                row.balance,
+            )
+            for row in BankBalance.objects.filter(transaction_count__gt=0)
+        }
+
+        mismatches = 0
+        for key in sorted(set(expected) | set(stored), key=str):
+            want = expected.get(key, (0, Decimal(0)))
+            have = stored.get(key, (0, Decimal(0)))
+            if want[0] != have[0] or cents(want[1]) != cents(have[1]):
+                mismatches += 1
+                user_id, bank_id, currency = key
+                self.stdout.write(
+                    f"user={user_id} bank={bank_id} {currency}: "
+                    f"stored {have[1]} ({have[0]} tx), "
+                    f"expected {want[1]} ({want[0]} tx)"
+                )
+
+        if not mismatches:
+            self.stdout.write(self.style.SUCCESS("All bank balances are consistent."))
+            return
+        if options["fix"]:
+            BankBalance.objects.rebuild()
+            self.stdout.write(
+                self.style.SUCCESS(f"Rebuilt after {mismatches} mismatches.")
+            )
+        else:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"{mismatches} mismatches, run with --fix to rebuild."
+                )
+            )
@@ -0,0 +1,62 @@
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from investment.importers import (
+    IMPORT_BATCH_SIZE,
+    ISO_DATE_FORMAT,
+    StatementImportError,
+    TransactionImporter,
+)
+from investment.models import Bank
+
+
+class Command(BaseCommand):
+    help = (
+        "Import bank statement CSV files (date, amount, optional note and type "
+        "columns) as transactions, skipping rows that were already imported."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("files", nargs="+")
+        parser.add_argument("--user", required=True, help="Username")
+        parser.add_argument("--bank", required=True, help="Bank name or id")
+        parser.add_argument("--currency", help="Defaults to the bank currency")
+        parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+        parser.add_argument("--date-format", default=ISO_DATE_FORMAT)
+        parser.add_argument("--encoding", default="utf-8-sig")
+
+    def handle(self, *args, **options):
+        try:
+            user = User.objects.get(username=options["user"])
+        except User.DoesNotExist:
+            raise CommandError(f"Unknown user {options['user']}")
+        banks = Bank.objects.filter(name=options["bank"])
+        if options["bank"].isdigit():
+            banks = Bank.objects.filter(pk=options["bank"])
+        bank = banks.first()
+        if bank is None:
+            raise CommandError(f"Unknown bank {options['bank']}")
+
+        importer = TransactionImporter(
+            user,
+            bank,
+            currency=options["currency"],
+            batch_size=options["batch_size"],
+            date_format=options["date_format"],
+        )
+        for path in options["files"]:
+            start = time.perf_counter()
+            with open(path, newline="", encoding=options["encoding"]) as handle:
+                try:
+                    result = importer.run(handle)
+                except StatementImportError as exc:
+                    raise CommandError(f"{path}: {exc}")
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{path}: imported {result.created}, skipped {result.skipped} "
+                    f"already imported rows in {elapsed:.1f}s."
+                )
+            )
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:19
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def backfill_balances(apps, schema_editor):
+    Transaction = apps.get_model("investment", "Transaction")
+    BankBalance = apps.get_model("investment", "BankBalance")
+    rows = (
+        Transaction.objects.values("user", "bank", "currency")
+        .annotate(transaction_count=Count("id"), balance=Sum("amount"))
+        .order_by()
+    )
+    BankBalance.objects.bulk_create(
+        BankBalance(
+            user_id=row["user"],
+            bank_id=row["bank"],
+            currency=row["currency"],
+            transaction_count=row["transaction_count"],
+            balance=row["balance"],
+        )
+        for row in rows
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investment", "0001_initial"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="BankBalance",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "currency",
+                    models.CharField(
+                        choices=[
+                            ("LKR", "Sri Lankan Rupee"),
+                            ("EUR", "Euro"),
+                            ("AUD", "Australian Dollar"),
+                        ],
+                        default="LKR",
+                        max_length=6,
+                    ),
+                ),
+                (
+                    "balance",
+                    models.DecimalField(decimal_places=2, default=0, max_digits=14),
+                ),
+                ("transaction_count", models.IntegerField(default=0)),
+                ("updated_at", models.DateTimeField(auto_now=True)),
+                (
+                    "bank",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to="investment.bank",
+                    ),
+                ),
+                (
+                    "user",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["user", "bank", "currency"],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("user", "bank", "currency"), name="unique_bank_balance"
+                    )
+                ],
+            },
+        ),
+        migrations.RunPython(backfill_balances, migrations.RunPython.noop),
+    ]
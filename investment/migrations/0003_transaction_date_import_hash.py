@@ -0,0 +1,26 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:21
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investment", "0002_bankbalance"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="transaction",
+            name="import_hash",
+            field=models.CharField(
+                blank=True, editable=False, max_length=64, null=True, unique=True
+            ),
+        ),
+        migrations.AlterField(
+            model_name="transaction",
+            name="date",
+            field=models.DateField(default=django.utils.timezone.localdate),
+        ),
+    ]
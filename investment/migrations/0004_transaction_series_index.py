@@ -0,0 +1,22 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:34
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("investment", "0003_transaction_date_import_hash"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="transaction",
+            index=models.Index(
+                fields=["user", "bank", "currency", "date", "amount"],
+                name="transaction_series",
+            ),
+        ),
+    ]
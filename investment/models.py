@@ -1,8 +1,16 @@
+from collections import defaultdict
+from decimal import Decimal
+
 from django.contrib.auth.models import User
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.utils import timezone
 
+from budget.rollups import apply_deltas
 from income.models import Currency
 
+from .summary import bump_summary_version
+
 
 class TransactionType:
     DEPOSIT = "deposit"
@@ -31,16 +39,113 @@ class Transaction(models.Model):
     currency = models.CharField(
         max_length=6, choices=Currency.CHOICES, default=Currency.LKR
     )
-    date = models.DateField(auto_now=True)
+    date = models.DateField(default=timezone.localdate)
     note = models.TextField(blank=True, null=True)
     type = models.CharField(
         max_length=20, choices=TransactionType.CHOICES, default=TransactionType.DEPOSIT
     )
+    # Content hash of statement rows loaded by the importer, used to skip
+    # rows that were already imported
+    import_hash = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False
+    )
+
+    class Meta:
+        indexes = [
+            # Covering index for the grouped running balances in series.py
+            models.Index(
+                fields=["user", "bank", "currency", "date", "amount"],
+                name="transaction_series",
+            ),
+        ]
 
     def save(self, *args, **kwargs):
         if self.type == TransactionType.WITHDRAWAL:
             self.amount = -abs(self.amount)
-        super().save(*args, **kwargs)
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = Transaction.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            BankBalance.objects.apply(
+                added=[self], removed=[previous] if previous else []
+            )
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            BankBalance.objects.apply(removed=[self])
+            return super().delete(*args, **kwargs)
 
     def __str__(self):
         return f"{self.user.username} - {self.amount} {self.currency}"
+
+
+class BankBalanceManager(models.Manager):
+    def apply(self, added=(), removed=()):
+        """Add and subtract transaction amounts to their balance snapshots."""
+        deltas = defaultdict(lambda: dict(transaction_count=0, balance=Decimal(0)))
+        for sign, transactions in ((1, added), (-1, removed)):
+            for item in transactions:
+                key = (item.user_id, item.bank_id, item.currency)
+                deltas[key]["transaction_count"] += sign
+                deltas[key]["balance"] += sign * Decimal(str(item.amount))
+
+        with transaction.atomic():
+            apply_deltas(self, ("user_id", "bank_id", "currency"), deltas)
+            transaction.on_commit(bump_summary_version)
+
+    def expected(self):
+        """Balances recomputed from the raw ``Transaction`` rows."""
+        return {
+            (row["user"], row["bank"], row["currency"]): (
+                row["transaction_count"],
+                row["balance"],
+            )
+            for row in Transaction.objects.values("user", "bank", "currency")
+            .annotate(transaction_count=Count("id"), balance=Sum("amount"))
+            .order_by()
+        }
+
+    def rebuild(self):
+        with transaction.atomic():
+            self.all().delete()
+            self.bulk_create(
+                self.model(
+                    user_id=user_id,
+                    bank_id=bank_id,
+                    currency=currency,
+                    transaction_count=count,
+                    balance=balance,
+                )
+                for (user_id, bank_id, currency), (
+                    count,
+                    balance,
+                ) in self.expected().items()
+            )
+            transaction.on_commit(bump_summary_version)
+
+
+class BankBalance(models.Model):
+    """Current balance per user, bank and currency, kept up to date on write."""
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    bank = models.ForeignKey(Bank, on_delete=models.CASCADE)
+    currency = models.CharField(
+        max_length=6, choices=Currency.CHOICES, default=Currency.LKR
+    )
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = BankBalanceManager()
+
+    class Meta:
+        ordering = ["user", "bank", "currency"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "bank", "currency"], name="unique_bank_balance"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.bank}: {self.balance} {self.currency}"
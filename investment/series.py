@@ -0,0 +1,125 @@
+import datetime
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.db.models import DecimalField, F, Sum, Window
+from django.utils import timezone
+
+from income.rates import exchange_rates
+from income.summary import month_end
+
+from .models import Bank
+from .summary import WindowSum
+
+DAY = "day"
+MONTH = "month"
+RESOLUTIONS = (DAY, MONTH)
+
+CENT = Decimal("0.01")
+BALANCE = DecimalField(max_digits=14, decimal_places=2)
+SERIES_KEY = ("user", "bank", "currency")
+
+
+def parse_date(value):
+    """Parse a ``YYYY-MM-DD`` string, returning ``None`` when invalid."""
+    try:
+        return datetime.date.fromisoformat(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def running_balances(queryset):
+    """Closing balance per user, bank and currency for each day.
+
+    Transactions are grouped by day and the running balance is a window sum
+    over the days of each series, so the database returns one row per day
+    instead of one per transaction. Grouping on the raw ``date`` column lets
+    the ``transaction_series`` index serve both the grouping and the window.
+    """
+    return (
+        queryset.values(*SERIES_KEY, "date")
+        .annotate(net=Sum("amount"))
+        # Annotated separately so the window isn't added to the GROUP BY
+        .annotate(
+            balance=Window(
+                WindowSum(Sum("amount"), output_field=BALANCE),
+                partition_by=[F(field) for field in SERIES_KEY],
+                order_by=F("date").asc(),
+            )
+        )
+        .order_by(*SERIES_KEY, "date")
+    )
+
+
+def opening_balances(queryset, date):
+    """Balance per series at the end of the day before ``date``."""
+    return {
+        tuple(row[field] for field in SERIES_KEY): row["balance"].quantize(CENT)
+        for row in queryset.filter(date__lt=date)
+        .values(*SERIES_KEY)
+        .annotate(balance=Sum("amount", output_field=BALANCE))
+        .order_by()
+    }
+
+
+def balance_series(queryset, resolution=MONTH, start=None, end=None):
+    """Running balances between ``start`` and ``end`` grouped into series.
+
+    Each point is dated at the close of its day or month (capped at ``end``)
+    and converted to LKR at the rate in effect on that date. When ``start``
+    is given every series opens with its balance on the day before.
+    """
+    end = end or timezone.localdate()
+    series, openings = {}, {}
+    if start:
+        opening_date = start - datetime.timedelta(days=1)
+        openings = opening_balances(queryset, start)
+        for key, balance in openings.items():
+            series[key] = [(opening_date, balance)]
+        queryset = queryset.filter(date__gte=start)
+    queryset = queryset.filter(date__lte=end)
+
+    for row in running_balances(queryset):
+        key = tuple(row[field] for field in SERIES_KEY)
+        # SQLite sums decimals as floats
+        balance = (openings.get(key, 0) + row["balance"]).quantize(CENT)
+        date = row["date"]
+        points = series.setdefault(key, [])
+        if resolution == MONTH:
+            # Down-sample to the last balance of each month
+            date = min(month_end(date.year, date.month), end)
+            if points and points[-1][0] == date:
+                points.pop()
+        points.append((date, balance))
+
+    # Names are looked up separately so the grouping stays on indexed columns
+    usernames = dict(
+        User.objects.filter(pk__in={key[0] for key in series}).values_list(
+            "pk", "username"
+        )
+    )
+    bank_names = dict(
+        Bank.objects.filter(pk__in={key[1] for key in series}).values_list("pk", "name")
+    )
+    results = []
+    for (user, bank, currency), points in sorted(
+        series.items(),
+        key=lambda item: (usernames[item[0][0]], bank_names[item[0][1]], item[0]),
+    ):
+        rates = exchange_rates.rate_series(currency, [date for date, _ in points])
+        results.append(
+            {
+                "user": usernames[user],
+                "bank": bank_names[bank],
+                "currency": currency,
+                "points": [
+                    {
+                        "date": date,
+                        "balance": balance,
+                        "balance_lkr": None if rate is None else balance * rate,
+                    }
+                    for (date, balance), rate in zip(points, rates)
+                ],
+            }
+        )
+    return results
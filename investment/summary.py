@@ -0,0 +1,106 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.db.models import Case, DecimalField, F, Func, Sum, Value, When, Window
+
+from budget.cache import bump_versions, get_or_build, get_version
+from income.models import Currency
+from income.rates import exchange_rates
+
+SUMMARY_CACHE_TIMEOUT = 60 * 60
+SUMMARY_VERSION_KEY = "transaction-summary-version"
+# Changelist parameters that page or sort the list without changing its rows
+IGNORED_PARAMS = {"p", "o"}
+
+LKR_AMOUNT = DecimalField(max_digits=20, decimal_places=4)
+
+
+class WindowSum(Func):
+    """``SUM(...) OVER ()`` around an aggregate, for a grand total column."""
+
+    function = "SUM"
+    window_compatible = True
+
+
+def lkr_rate(date):
+    """``CASE`` expression mapping each currency to its LKR rate on ``date``."""
+    whens = []
+    for currency, _ in Currency.CHOICES:
+        rate = exchange_rates.rate(currency, date)
+        if rate is not None:
+            whens.append(When(currency=currency, then=Value(rate)))
+    return Case(*whens, default=None, output_field=LKR_AMOUNT)
+
+
+def transaction_summary(queryset, date):
+    """Per user/bank/currency totals, LKR amounts and the grand total.
+
+    Everything is computed by the database in one grouped query; the grand
+    total is a window sum over the grouped rows.
+    """
+    amount_lkr = F("amount") * lkr_rate(date)
+    return (
+        queryset.values("user__username", "bank__name", "currency")
+        .annotate(
+            total_amount=Sum("amount"),
+            amount_lkr=Sum(amount_lkr, output_field=LKR_AMOUNT),
+            grand_total_lkr=Window(WindowSum(Sum(amount_lkr), output_field=LKR_AMOUNT)),
+        )
+        .order_by("user__username", "bank__name")
+    )
+
+
+def balance_summary(balances, date):
+    """The same rows as ``transaction_summary`` read from ``BankBalance``."""
+    amount_lkr = F("balance") * lkr_rate(date)
+    return (
+        balances.values("user__username", "bank__name", "currency")
+        .annotate(
+            total_amount=F("balance"),
+            amount_lkr=amount_lkr,
+            grand_total_lkr=Window(Sum(amount_lkr, output_field=LKR_AMOUNT)),
+        )
+        .order_by("user__username", "bank__name")
+    )
+
+
+def bump_summary_version():
+    bump_versions(SUMMARY_VERSION_KEY)
+
+
+def summary_cache_key(params, date):
+    """Cache key for the changelist filters in ``params`` on ``date``."""
+    normalized = urlencode(
+        sorted(
+            (key, value)
+            for key, values in params.lists()
+            if key not in IGNORED_PARAMS
+            for value in values
+        )
+    )
+    rates = [exchange_rates.rate(currency, date) for currency, _ in Currency.CHOICES]
+    digest = hashlib.md5(
+        f"{normalized}|{date}|{rates}".encode(), usedforsecurity=False
+    ).hexdigest()
+    return f"transaction-totals:{get_version(SUMMARY_VERSION_KEY)}:{digest}"
+
+
+def get_cached_summary(params, date, build):
+    """Return ``(rows, grand_total_lkr, missing_rates)``, built on a cache miss.
+
+    ``missing_rates`` lists the currencies of balances without an exchange
+    rate; the grand total is ``None`` then instead of leaving them out.
+    """
+    key = summary_cache_key(params, date)
+
+    def build_rows():
+        rows = list(build())
+        missing_rates = sorted(
+            {row["currency"] for row in rows if row["amount_lkr"] is None}
+        )
+        if missing_rates:
+            return rows, None, missing_rates
+        grand_total = rows[0]["grand_total_lkr"] if rows else 0
+        return rows, grand_total or 0, missing_rates
+
+    return get_or_build(key, build_rows, SUMMARY_CACHE_TIMEOUT)
@@ -1,3 +1,350 @@
+import datetime
+import io
+import random
+from decimal import Decimal
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+
+from income.models import Currency, ExchangeRate
+from income.rates import exchange_rates
+
+from .importers import ImportResult, StatementImportError, TransactionImporter
+from .management.commands.benchmark_balance_history import python_balances
+from .models import Bank, BankBalance, Transaction, TransactionType
+from .series import DAY, MONTH, balance_series
+from .summary import transaction_summary
+
+
+class BankBalanceTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+        cls.bank = Bank.objects.create(name="Sampath")
+
+    def setUp(self):
+        cache.clear()
+
+    def create_transaction(self, amount, **fields):
+        return Transaction.objects.create(
+            user=self.user,
+            bank=self.bank,
+            amount=amount,
+            date=datetime.date(2024, 1, 1),
+            **fields,
+        )
+
+    def balance(self, currency=Currency.LKR):
+        row = BankBalance.objects.get(user=self.user, bank=self.bank, currency=currency)
+        return row.transaction_count, row.balance
+
+    def test_writes_update_the_snapshot(self):
+        deposit = self.create_transaction(1000)
+        self.create_transaction(250, type=TransactionType.WITHDRAWAL)
+        self.assertEqual(self.balance(), (2, Decimal("750.00")))
+
+        deposit.amount = Decimal("1200.00")
+        deposit.save()
+        self.assertEqual(self.balance(), (2, Decimal("950.00")))
+
+        deposit.currency = Currency.EUR
+        deposit.save()
+        self.assertEqual(self.balance(), (1, Decimal("-250.00")))
+        self.assertEqual(self.balance(Currency.EUR), (1, Decimal("1200.00")))
+
+        deposit.delete()
+        self.assertEqual(self.balance(Currency.EUR), (0, Decimal("0.00")))
+
+    def test_withdrawals_are_stored_negative(self):
+        for amount in (300, -300):
+            withdrawal = self.create_transaction(
+                amount, type=TransactionType.WITHDRAWAL
+            )
+            withdrawal.refresh_from_db()
+            self.assertEqual(withdrawal.amount, Decimal("-300.00"))
+        self.assertEqual(self.balance(), (2, Decimal("-600.00")))
+
+    def test_check_bank_balances(self):
+        self.create_transaction(1000)
+        self.create_transaction(400, type=TransactionType.WITHDRAWAL)
+        out = io.StringIO()
+        call_command("check_bank_balances", stdout=out)
+        self.assertIn("consistent", out.getvalue())
+
+        # Written behind the ledger's back
+        Transaction.objects.filter(type=TransactionType.DEPOSIT).update(amount=900)
+        out = io.StringIO()
+        call_command("check_bank_balances", stdout=out)
+        self.assertIn("1 mismatches", out.getvalue())
+        self.assertEqual(self.balance(), (2, Decimal("600.00")))
+
+        call_command("check_bank_balances", "--fix", stdout=io.StringIO())
+        self.assertEqual(self.balance(), (2, Decimal("500.00")))
+
+
+class TransactionSummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.banks = [Bank.objects.create(name=name) for name in ("Sampath", "HNB")]
+        ExchangeRate.objects.create(
+            currency=Currency.EUR, date=datetime.date(2024, 1, 1), rate=300
+        )
+
+    def setUp(self):
+        cache.clear()
+        exchange_rates.clear()
+        self.client.force_login(self.admin)
+        self.url = reverse("admin:investment_transaction_changelist")
+
+    def create_transaction(self, bank, amount, currency=Currency.LKR):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Transaction.objects.create(
+                user=self.admin,
+                bank=bank,
+                amount=amount,
+                currency=currency,
+                date=datetime.date(2024, 1, 1),
+            )
+
+    def test_summary_rows_and_grand_total(self):
+        self.create_transaction(self.banks[0], 1000)
+        self.create_transaction(self.banks[0], 500)
+        self.create_transaction(self.banks[1], 10, Currency.EUR)
+        response = self.client.get(self.url)
+        rows = {
+            row["bank__name"]: (row["total_amount"], row["amount_lkr"])
+            for row in response.context["summary_data"]
+        }
+        self.assertEqual(rows, {"Sampath": (1500, 1500), "HNB": (10, 3000)})
+        self.assertEqual(response.context["grand_total_lkr"], 4500)
+
+        response = self.client.get(self.url, {"bank__id__exact": self.banks[0].pk})
+        self.assertEqual(response.context["grand_total_lkr"], 1500)
+
+    def test_missing_rates_leave_the_grand_total_incomplete(self):
+        self.create_transaction(self.banks[0], 10)
+        self.create_transaction(self.banks[1], 10, Currency.AUD)
+        response = self.client.get(self.url)
+        self.assertIsNone(response.context["grand_total_lkr"])
+        self.assertEqual(response.context["missing_rates"], [Currency.AUD])
+        self.assertContains(response, "Incomplete, no exchange rate for AUD")
+
+    def test_paging_and_sorting_reuse_the_cached_summary(self):
+        self.create_transaction(self.banks[0], 1000)
+        filters = {"bank__id__exact": self.banks[0].pk}
+        with mock.patch(
+            "investment.admin.transaction_summary", wraps=transaction_summary
+        ) as build:
+            self.client.get(self.url, filters)
+            self.client.get(self.url, {**filters, "o": "-1"})
+            self.client.get(self.url, {**filters, "p": "1", "o": "2"})
+            self.assertEqual(build.call_count, 1)
+
+            self.create_transaction(self.banks[0], 250)
+            response = self.client.get(self.url, {**filters, "o": "-1"})
+            self.assertEqual(build.call_count, 2)
+        self.assertEqual(response.context["grand_total_lkr"], 1250)
+
+
+class BalanceSeriesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        users = [User.objects.create_user(name) for name in ("alice", "bob")]
+        banks = [Bank.objects.create(name=name) for name in ("Sampath", "HNB")]
+        rng = random.Random(0)
+        Transaction.objects.bulk_create(
+            Transaction(
+                user=rng.choice(users),
+                bank=rng.choice(banks),
+                currency=rng.choice([Currency.LKR, Currency.EUR]),
+                date=datetime.date(2024, 1, 1)
+                + datetime.timedelta(days=rng.randrange(120)),
+                amount=Decimal(rng.randint(-50000, 100000)) / 100,
+            )
+            for _ in range(300)
+        )
+
+    def series(self, resolution, **window):
+        return {
+            (row["user"], row["bank"], row["currency"]): {
+                point["date"]: point["balance"] for point in row["points"]
+            }
+            for row in balance_series(
+                Transaction.objects.all(),
+                resolution,
+                end=datetime.date(2024, 12, 31),
+                **window,
+            )
+        }
+
+    def test_matches_a_python_running_sum(self):
+        expected = python_balances(Transaction.objects.all(), DAY)
+        self.assertEqual(self.series(DAY), expected)
+
+        monthly = {
+            key: {date.replace(day=1): balance for date, balance in points.items()}
+            for key, points in self.series(MONTH).items()
+        }
+        self.assertEqual(monthly, python_balances(Transaction.objects.all(), MONTH))
+
+    def test_window_opens_with_the_previous_balance(self):
+        start = datetime.date(2024, 3, 1)
+        expected = python_balances(Transaction.objects.all(), DAY)
+        for key, points in self.series(DAY, start=start).items():
+            opening_date, *dates = sorted(points)
+            self.assertEqual(opening_date, start - datetime.timedelta(days=1))
+            before = [date for date in expected[key] if date < start]
+            self.assertEqual(points[opening_date], expected[key][max(before)])
+            self.assertEqual(
+                {date: points[date] for date in dates},
+                {date: value for date, value in expected[key].items() if date >= start},
+            )
+
+
+class TransactionImporterTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("alice")
+        cls.bank = Bank.objects.create(name="Sampath")
+
+    def setUp(self):
+        cache.clear()
+
+    def run_import(self, text, **options):
+        importer = TransactionImporter(self.user, self.bank, batch_size=2, **options)
+        return importer.run(io.StringIO(text))
+
+    def test_signs_and_dates(self):
+        result = self.run_import(
+            "date,amount,note,type\n"
+            '2024-01-05,"1,000.50",Salary,\n'
+            "2024-01-06,-200,ATM,\n"
+            "2024-01-07,300,Rent,withdrawal\n"
+        )
+        self.assertEqual(result, ImportResult(created=3, skipped=0))
+        self.assertEqual(
+            list(
+                Transaction.objects.order_by("date").values_list(
+                    "date", "amount", "type", "currency", "note"
+                )
+            ),
+            [
+                (
+                    datetime.date(2024, 1, 5),
+                    Decimal("1000.50"),
+                    "deposit",
+                    "LKR",
+                    "Salary",
+                ),
+                (
+                    datetime.date(2024, 1, 6),
+                    Decimal("-200.00"),
+                    "withdrawal",
+                    "LKR",
+                    "ATM",
+                ),
+                (
+                    datetime.date(2024, 1, 7),
+                    Decimal("-300.00"),
+                    "withdrawal",
+                    "LKR",
+                    "Rent",
+                ),
+            ],
+        )
+        self.assertEqual(
+            BankBalance.objects.get(user=self.user, bank=self.bank).balance,
+            Decimal("500.50"),
+        )
+
+    def test_date_format(self):
+        self.run_import("date,amount\n05/01/2024,10\n", date_format="%d/%m/%Y")
+        self.assertEqual(Transaction.objects.get().date, datetime.date(2024, 1, 5))
+
+    def test_reimport_skips_known_rows(self):
+        statement = (
+            "date,amount,note\n2024-01-05,100,A\n2024-01-05,100,A\n2024-01-06,5,B\n"
+        )
+        self.assertEqual(self.run_import(statement), ImportResult(2, 1))
+        self.assertEqual(
+            self.run_import(statement + "2024-01-07,7,C\n"), ImportResult(1, 3)
+        )
+        balance = BankBalance.objects.get(user=self.user, bank=self.bank)
+        self.assertEqual((balance.transaction_count, balance.balance), (3, 112))
+
+    def test_bad_row_imports_nothing(self):
+        with self.assertRaisesMessage(StatementImportError, "Line 4"):
+            self.run_import("date,amount\n2024-01-05,1\n2024-01-06,2\nyesterday,3\n")
+        self.assertFalse(Transaction.objects.exists())
+        self.assertFalse(BankBalance.objects.filter(transaction_count__gt=0).exists())
+
+
+class BalanceHistoryViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        bank = Bank.objects.create(name="Sampath")
+        Transaction.objects.create(
+            user=cls.staff, bank=bank, amount=100, date=datetime.date(2024, 1, 1)
+        )
+
+    def test_requires_view_permission(self):
+        self.client.force_login(self.staff)
+        urls = [
+            reverse("admin:investment-balance-history"),
+            reverse("admin:investment-balance-history-api"),
+        ]
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 403)
+
+        self.staff.user_permissions.add(
+            Permission.objects.get(codename="view_transaction")
+        )
+        for url in urls:
+            self.assertEqual(self.client.get(url).status_code, 200)
+        series = self.client.get(urls[1]).json()["series"]
+        self.assertEqual(series[0]["points"][-1]["balance"], "100.00")
+
+
+class TransactionImportViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user("staff", is_staff=True)
+        cls.alice = User.objects.create_user("alice")
+        cls.bank = Bank.objects.create(name="Sampath")
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.staff)
+        self.url = reverse("admin:investment-transaction-import")
+
+    def post_statement(self):
+        return self.client.post(
+            self.url,
+            {
+                "file": SimpleUploadedFile(
+                    "statement.csv", b"date,amount\n2024-01-05,10\n"
+                ),
+                "user": self.alice.pk,
+                "bank": self.bank.pk,
+                "currency": "",
+                "date_format": "%Y-%m-%d",
+            },
+        )
+
+    def test_requires_add_permission(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.post_statement().status_code, 403)
+        self.assertFalse(Transaction.objects.exists())
 
-# Create your tests here.
+        self.staff.user_permissions.add(
+            Permission.objects.get(codename="add_transaction")
+        )
+        self.assertEqual(self.post_statement().status_code, 302)
+        self.assertEqual(Transaction.objects.get().user, self.alice)
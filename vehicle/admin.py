@@ -1,25 +1,159 @@
 from django.contrib import admin
-from django.utils.html import mark_safe
+from django.db import transaction
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import format_html, mark_safe
 
 from budget.admin import admin_site
 
-from .models import ServicePart, VehicleService, VehicleServiceDocument
+from .cache import bump_analytics_version
+from .models import (
+    Garage,
+    ServicePart,
+    ServiceReminder,
+    Shop,
+    Vehicle,
+    VehicleService,
+    VehicleServiceDocument,
+)
+
+
+class VehicleAdmin(admin.ModelAdmin):
+    list_display = (
+        "name",
+        "plate_number",
+        "service_count",
+        "service_cost",
+        "parts_cost",
+        "last_service_date",
+        "last_mileage",
+    )
+    search_fields = ("name", "plate_number")
+    ordering = ("name",)
+
+
+class GarageAdmin(admin.ModelAdmin):
+    list_display = ("name", "location")
+    search_fields = ("name", "location")
+
+
+class ShopAdmin(admin.ModelAdmin):
+    list_display = ("name", "location")
+    search_fields = ("name", "location")
+
+    def delete_queryset(self, request, queryset):
+        # Parts sold by the shops are deleted with them
+        with transaction.atomic():
+            Vehicle.objects.apply(
+                removed=ServicePart.objects.filter(shop__in=queryset).select_related(
+                    "service"
+                )
+            )
+            transaction.on_commit(bump_analytics_version)
+            super().delete_queryset(request, queryset)
+
+
+class OverdueFilter(admin.SimpleListFilter):
+    title = "status"
+    parameter_name = "overdue"
+
+    def lookups(self, request, model_admin):
+        return (("yes", "Overdue"), ("no", "Upcoming"))
+
+    def queryset(self, request, queryset):
+        today = timezone.localdate()
+        if self.value() == "yes":
+            return queryset.overdue(today)
+        if self.value() == "no":
+            return queryset.filter(due_date__gt=today)
+        return queryset
+
+
+class ServiceReminderAdmin(admin.ModelAdmin):
+    # Computed by the refresh_service_reminders command, not edited here
+    list_display = (
+        "vehicle",
+        "service_type",
+        "due_date",
+        "due_mileage",
+        "estimated_mileage",
+        "last_service_date",
+        "last_mileage",
+    )
+    list_filter = (OverdueFilter, "service_type")
+    list_select_related = ("vehicle",)
+    search_fields = ("vehicle__name", "vehicle__plate_number")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
 
 
 class VehicleServiceDocumentInline(admin.TabularInline):
     model = VehicleServiceDocument
     extra = 0
-    fields = ("document",)
+    fields = ("get_preview", "document", "get_download_link")
+    readonly_fields = ("get_preview", "get_download_link")
+
+    def get_preview(self, obj):
+        # Only the rendered thumbnail is sent, never the original upload
+        if not obj.thumbnail:
+            return "-"
+        return format_html(
+            '<a href="{}" target="_blank"><img src="{}" alt="" loading="lazy"></a>',
+            reverse("vehicle-document-preview", args=[obj.pk, "preview"]),
+            reverse("vehicle-document-preview", args=[obj.pk, "thumbnail"]),
+        )
+
+    get_preview.short_description = "Preview"
+
+    def get_download_link(self, obj):
+        if not obj.pk:
+            return "-"
+        return format_html(
+            '<a href="{}">{}</a>',
+            reverse("vehicle-document-download", args=[obj.pk]),
+            obj.original_name or obj.document.name,
+        )
+
+    get_download_link.short_description = "Download"
 
 
 class ServicePartInline(admin.TabularInline):
     model = ServicePart
     extra = 0  # No extra forms by default since focus is on list view
     fields = ("shop", "part_name", "quantity", "total_cost")
+    autocomplete_fields = ("shop",)
     verbose_name = "Service Part"
     verbose_name_plural = "Service Parts"
 
 
+class TotalCostFilter(admin.SimpleListFilter):
+    title = "total cost"
+    parameter_name = "total_cost"
+    # (lookup, label, lower bound, upper bound) in LKR
+    RANGES = (
+        ("lt10k", "Under LKR 10,000", None, 10000),
+        ("10k-50k", "LKR 10,000 - 50,000", 10000, 50000),
+        ("50k-100k", "LKR 50,000 - 100,000", 50000, 100000),
+        ("gte100k", "LKR 100,000 and over", 100000, None),
+    )
+
+    def lookups(self, request, model_admin):
+        return [(lookup, label) for lookup, label, _, _ in self.RANGES]
+
+    def queryset(self, request, queryset):
+        for lookup, _, lower, upper in self.RANGES:
+            if self.value() == lookup:
+                if lower is not None:
+                    queryset = queryset.filter(total_with_parts__gte=lower)
+                if upper is not None:
+                    queryset = queryset.filter(total_with_parts__lt=upper)
+        return queryset
+
+
 class VehicleServiceAdmin(admin.ModelAdmin):
     list_display = (
         "vehicle",
@@ -31,6 +165,7 @@ class VehicleServiceAdmin(admin.ModelAdmin):
         "get_total_cost_with_parts",
         "garage",
     )
+    list_filter = (TotalCostFilter,)
     date_hierarchy = "service_date"
     ordering = ("-service_date",)
     fields = (
@@ -42,6 +177,7 @@ class VehicleServiceAdmin(admin.ModelAdmin):
         "mileage",
         "garage",
     )
+    autocomplete_fields = ("vehicle", "garage")
     inlines = [ServicePartInline, VehicleServiceDocumentInline]
     list_per_page = 25
     actions = None
@@ -49,14 +185,24 @@ class VehicleServiceAdmin(admin.ModelAdmin):
     class Media:
         css = {"all": ("admin/css/changelists.css",)}
 
+    def get_queryset(self, request):
+        # Totals are summed in SQL and the parts for a page are fetched in
+        # one query, so the page costs the same number of queries at any size
+        return (
+            super()
+            .get_queryset(request)
+            .select_related("vehicle", "garage")
+            .prefetch_related("parts")
+            .with_totals()
+        )
+
     def get_parts_total_cost(self, obj):
-        """Calculate total cost of all parts for this service"""
-        return sum(part.total_cost for part in obj.parts.all())
+        """Total cost of all parts for this service"""
+        return round(obj.parts_total, 2)
 
     def get_total_cost_with_parts(self, obj):
-        """Calculate total cost including service cost and parts cost"""
-        parts_cost = self.get_parts_total_cost(obj)
-        return obj.cost + parts_cost
+        """Total cost including service cost and parts cost"""
+        return round(obj.total_with_parts, 2)
 
     def get_parts_summary(self, obj):
         """Display parts summary with better formatting for admin"""
@@ -77,7 +223,13 @@ class VehicleServiceAdmin(admin.ModelAdmin):
 
     get_parts_summary.short_description = "Parts Details"
     get_parts_total_cost.short_description = "Parts Total"
+    get_parts_total_cost.admin_order_field = "parts_total"
     get_total_cost_with_parts.short_description = "Total (Service + Parts)"
+    get_total_cost_with_parts.admin_order_field = "total_with_parts"
 
 
+admin_site.register(Vehicle, VehicleAdmin)
+admin_site.register(Garage, GarageAdmin)
+admin_site.register(Shop, ShopAdmin)
+admin_site.register(ServiceReminder, ServiceReminderAdmin)
 admin_site.register(VehicleService, VehicleServiceAdmin)
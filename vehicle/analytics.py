@@ -0,0 +1,140 @@
+import datetime
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db.models import Count, DecimalField, F, Q, Sum, Value, Window
+from django.db.models.functions import Coalesce, Lag
+
+from .models import Garage, ServicePart, Shop, Vehicle, VehicleService
+
+TRAILING_DAYS = 365
+
+AMOUNT = DecimalField(max_digits=14, decimal_places=2)
+CENT = Decimal("0.01")
+
+
+def grouped_spend(queryset, group, amount, date_field, since):
+    """Count, lifetime and trailing ``amount`` of ``queryset`` per ``group``."""
+    return {
+        row[group]: row
+        for row in queryset.values(group)
+        .annotate(
+            count=Count("id"),
+            lifetime=Coalesce(Sum(amount), Value(Decimal(0)), output_field=AMOUNT),
+            trailing=Coalesce(
+                Sum(amount, filter=Q(**{f"{date_field}__gte": since})),
+                Value(Decimal(0)),
+                output_field=AMOUNT,
+            ),
+        )
+        .order_by()
+    }
+
+
+def service_spend(group, since):
+    """Service cost plus the cost of their parts per ``group`` of services."""
+    services = grouped_spend(
+        VehicleService.objects.all(), group, "cost", "service_date", since
+    )
+    parts = grouped_spend(
+        ServicePart.objects.all(),
+        f"service__{group}",
+        "total_cost",
+        "service__service_date",
+        since,
+    )
+    totals = {key: dict(row) for key, row in services.items()}
+    for key, row in parts.items():
+        totals[key]["lifetime"] += row["lifetime"]
+        totals[key]["trailing"] += row["trailing"]
+    return totals
+
+
+def breakdown(totals, labels):
+    """Rows sorted by lifetime spend with their share of the overall total."""
+    overall = sum(item["lifetime"] for item in totals.values()) or 1
+    rows = [
+        {
+            "key": key,
+            "name": labels.get(key, key) if key is not None else "Unknown",
+            "count": item["count"],
+            "lifetime": Decimal(item["lifetime"]).quantize(CENT),
+            "trailing": Decimal(item["trailing"]).quantize(CENT),
+            "share": round(100 * item["lifetime"] / overall, 1),
+        }
+        for key, item in totals.items()
+    ]
+    return sorted(rows, key=lambda row: row["lifetime"], reverse=True)
+
+
+def distance_costs():
+    """Kilometres driven and the cost of covering them, per vehicle.
+
+    ``Lag`` pairs each service with the previous one that recorded mileage,
+    so each row carries the distance since then. The services that close an
+    interval carry its cost. Negative deltas (odometer changes) are ignored.
+    """
+    services = (
+        VehicleService.objects.filter(mileage__isnull=False)
+        .with_totals()
+        .annotate(
+            previous_mileage=Window(
+                Lag("mileage"),
+                partition_by=[F("vehicle")],
+                order_by=[F("service_date").asc(), F("id").asc()],
+            )
+        )
+        .values_list("vehicle", "mileage", "previous_mileage", "total_with_parts")
+        .order_by()
+    )
+    distances = defaultdict(lambda: [0, Decimal(0)])
+    for vehicle, mileage, previous, total in services.iterator(chunk_size=5000):
+        if previous is not None and mileage >= previous:
+            distances[vehicle][0] += mileage - previous
+            distances[vehicle][1] += total
+    return distances
+
+
+def build_analytics(today):
+    """Vehicle cost analytics as of ``today``, in a fixed number of queries.
+
+    Service costs and part costs are grouped separately and added up in
+    Python, since summing both over one join would count each service once
+    per part.
+    """
+    since = today - datetime.timedelta(days=TRAILING_DAYS)
+
+    vehicles = breakdown(
+        service_spend("vehicle", since),
+        dict(Vehicle.objects.values_list("id", "name")),
+    )
+    distances = distance_costs()
+    for row in vehicles:
+        km, cost = distances.get(row["key"], (0, 0))
+        row["km"] = km
+        row["cost_per_km"] = (cost / km).quantize(CENT) if km else None
+
+    return {
+        "since": since,
+        "vehicles": vehicles,
+        "garages": breakdown(
+            grouped_spend(
+                VehicleService.objects.all(), "garage", "cost", "service_date", since
+            ),
+            {garage.pk: str(garage) for garage in Garage.objects.all()},
+        ),
+        "shops": breakdown(
+            grouped_spend(
+                ServicePart.objects.all(),
+                "shop",
+                "total_cost",
+                "service__service_date",
+                since,
+            ),
+            {shop.pk: str(shop) for shop in Shop.objects.all()},
+        ),
+        "service_types": breakdown(
+            service_spend("service_type", since),
+            dict(VehicleService.SERVICE_TYPES),
+        ),
+    }
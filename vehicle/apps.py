@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class VehicleConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "vehicle"
+
+    def ready(self):
+        from .search import repair_search_index
+
+        post_migrate.connect(repair_search_index, sender=self)
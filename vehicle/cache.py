@@ -0,0 +1,14 @@
+from budget.cache import bump_versions, get_or_build, get_version
+
+ANALYTICS_CACHE_TIMEOUT = 60 * 60 * 24
+ANALYTICS_VERSION_KEY = "vehicle-analytics-version"
+
+
+def bump_analytics_version():
+    bump_versions(ANALYTICS_VERSION_KEY)
+
+
+def get_cached_analytics(today, build):
+    """Vehicle analytics for ``today``, cached until a service or part changes."""
+    key = f"vehicle-analytics:{get_version(ANALYTICS_VERSION_KEY)}:{today.isoformat()}"
+    return get_or_build(key, lambda: build(today), ANALYTICS_CACHE_TIMEOUT)
@@ -0,0 +1,73 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from vehicle.models import VehicleServiceDocument, delete_orphaned_document
+from vehicle.storage import document_storage, preview_names
+
+UPLOAD_DIRECTORY = "vehicle_service_docs"
+# Interrupted uploads leave ".upload-*" files behind; younger ones may still
+# be in progress
+STALE_UPLOAD_SECONDS = 60 * 60
+PREVIEW_SUFFIXES = tuple(name.removeprefix("blob") for name in preview_names("blob"))
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete stored vehicle service document files that no document "
+        "references, e.g. after documents were removed outside the ORM."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        referenced = set(
+            VehicleServiceDocument.objects.values_list("document", flat=True)
+        )
+        for name in list(referenced):
+            referenced.update(preview_names(name))
+        removed = freed = 0
+        for name in self.walk(UPLOAD_DIRECTORY):
+            basename = os.path.basename(name)
+            if name in referenced:
+                continue
+            if basename.startswith(".upload-"):
+                age = time.time() - os.path.getmtime(document_storage.path(name))
+                if age < STALE_UPLOAD_SECONDS:
+                    continue
+            if not document_storage.exists(name):
+                # A preview deleted along with its blob
+                continue
+            size = document_storage.size(name)
+            if not options["dry_run"] and not self.delete(name):
+                continue
+            removed += 1
+            freed += size
+
+        action = "Would delete" if options["dry_run"] else "Deleted"
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{action} {removed} orphaned files ({freed / 1024 / 1024:.1f} MiB)."
+            )
+        )
+
+    def delete(self, name):
+        if os.path.basename(name).startswith(".upload-") or name.endswith(
+            PREVIEW_SUFFIXES
+        ):
+            document_storage.delete(name)
+            return True
+        # Blobs are re-checked under their lock, an upload may have
+        # referenced them since the listing
+        return delete_orphaned_document(name)
+
+    def walk(self, directory):
+        if not document_storage.exists(directory):
+            return
+        directories, files = document_storage.listdir(directory)
+        for name in files:
+            yield f"{directory}/{name}"
+        for name in directories:
+            yield from self.walk(f"{directory}/{name}")
@@ -0,0 +1,34 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from vehicle import previews
+
+
+class Command(BaseCommand):
+    help = (
+        "Render thumbnails and first page previews of uploaded vehicle service "
+        "documents from the database queue. Runs until interrupted unless "
+        "--once is given. PDFs need poppler's pdftoppm."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--once", action="store_true", help="Drain the queue and exit"
+        )
+        parser.add_argument("--batch-size", type=int, default=20)
+        parser.add_argument(
+            "--interval", type=float, default=5, help="Seconds between queue polls"
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            jobs = previews.claim_jobs(options["batch_size"])
+            for job in jobs:
+                job = previews.process_job(job)
+                if job is not None and options["verbosity"] > 1:
+                    self.stdout.write(f"{job.document}: {job.status} {job.error}")
+            if not jobs:
+                if options["once"]:
+                    break
+                time.sleep(options["interval"])
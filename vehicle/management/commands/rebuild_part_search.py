@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from vehicle.search import install_search_index
+
+
+class Command(BaseCommand):
+    help = (
+        "Recreate the part name search index and its triggers, e.g. after a "
+        "migration rebuilt the vehicle_servicepart table."
+    )
+
+    def handle(self, *args, **options):
+        install_search_index(connection)
+        self.stdout.write(self.style.SUCCESS("Rebuilt the part search index."))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from vehicle.models import Vehicle
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized service and part totals on every Vehicle."
+
+    def handle(self, *args, **options):
+        count = Vehicle.objects.refresh()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt totals for {count} vehicles."))
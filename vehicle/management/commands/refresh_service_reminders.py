@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from vehicle.reminders import refresh_reminders
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the next due date of each recurring service for every "
+        "vehicle. Meant to run daily, e.g. from cron."
+    )
+
+    def handle(self, *args, **options):
+        today = timezone.localdate()
+        reminders = refresh_reminders(today)
+        overdue = sum(reminder.due_date <= today for reminder in reminders)
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Refreshed {len(reminders)} service reminders, {overdue} overdue."
+            )
+        )
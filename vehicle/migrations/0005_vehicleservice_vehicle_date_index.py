@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0004_shop_servicepart"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="vehicleservice",
+            index=models.Index(
+                fields=["vehicle", "service_date"], name="vehicleservice_vehicle_date"
+            ),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:41
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def backfill_totals(apps, schema_editor):
+    Vehicle = apps.get_model("vehicle", "Vehicle")
+    VehicleService = apps.get_model("vehicle", "VehicleService")
+    ServicePart = apps.get_model("vehicle", "ServicePart")
+    services = (
+        VehicleService.objects.filter(vehicle=OuterRef("pk"))
+        .order_by()
+        .values("vehicle")
+    )
+    parts = (
+        ServicePart.objects.filter(service__vehicle=OuterRef("pk"))
+        .order_by()
+        .values("service__vehicle")
+    )
+    latest = VehicleService.objects.filter(vehicle=OuterRef("pk")).order_by(
+        "-service_date", "-id"
+    )
+    amount = models.DecimalField(max_digits=14, decimal_places=2)
+    Vehicle.objects.update(
+        service_count=Coalesce(
+            Subquery(services.annotate(total=Count("id")).values("total")), 0
+        ),
+        service_cost=Coalesce(
+            Subquery(services.annotate(total=Sum("cost")).values("total")),
+            Value(Decimal(0)),
+            output_field=amount,
+        ),
+        part_count=Coalesce(
+            Subquery(parts.annotate(total=Count("id")).values("total")), 0
+        ),
+        parts_cost=Coalesce(
+            Subquery(parts.annotate(total=Sum("total_cost")).values("total")),
+            Value(Decimal(0)),
+            output_field=amount,
+        ),
+        last_service_date=Subquery(latest.values("service_date")[:1]),
+        last_mileage=Subquery(
+            latest.filter(mileage__isnull=False).values("mileage")[:1]
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0005_vehicleservice_vehicle_date_index"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehicle",
+            name="last_mileage",
+            field=models.PositiveIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="vehicle",
+            name="last_service_date",
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="vehicle",
+            name="part_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="vehicle",
+            name="parts_cost",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14
+            ),
+        ),
+        migrations.AddField(
+            model_name="vehicle",
+            name="service_cost",
+            field=models.DecimalField(
+                decimal_places=2, default=0, editable=False, max_digits=14
+            ),
+        ),
+        migrations.AddField(
+            model_name="vehicle",
+            name="service_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(backfill_totals, migrations.RunPython.noop),
+    ]
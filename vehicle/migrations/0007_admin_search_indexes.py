@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0006_vehicle_totals"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="garage",
+            index=models.Index(fields=["name"], name="garage_name"),
+        ),
+        migrations.AddIndex(
+            model_name="garage",
+            index=models.Index(fields=["location"], name="garage_location"),
+        ),
+        migrations.AddIndex(
+            model_name="shop",
+            index=models.Index(fields=["name"], name="shop_name"),
+        ),
+        migrations.AddIndex(
+            model_name="shop",
+            index=models.Index(fields=["location"], name="shop_location"),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(fields=["name"], name="vehicle_name"),
+        ),
+        migrations.AddIndex(
+            model_name="vehicle",
+            index=models.Index(fields=["plate_number"], name="vehicle_plate_number"),
+        ),
+    ]
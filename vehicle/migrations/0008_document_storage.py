@@ -0,0 +1,40 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:43
+
+import os
+
+import vehicle.storage
+from django.db import migrations, models
+
+
+def backfill_original_names(apps, schema_editor):
+    VehicleServiceDocument = apps.get_model("vehicle", "VehicleServiceDocument")
+    documents = list(VehicleServiceDocument.objects.all())
+    for document in documents:
+        document.original_name = os.path.basename(document.document.name)
+    VehicleServiceDocument.objects.bulk_update(documents, ["original_name"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0007_admin_search_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehicleservicedocument",
+            name="original_name",
+            field=models.CharField(blank=True, editable=False, max_length=255),
+        ),
+        migrations.AlterField(
+            model_name="vehicleservicedocument",
+            name="document",
+            field=models.FileField(
+                db_index=True,
+                max_length=255,
+                storage=vehicle.storage.ContentAddressedStorage(),
+                upload_to="vehicle_service_docs/",
+            ),
+        ),
+        migrations.RunPython(backfill_original_names, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,85 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:47
+
+import vehicle.storage
+from django.db import migrations, models
+
+
+def queue_existing_documents(apps, schema_editor):
+    VehicleServiceDocument = apps.get_model("vehicle", "VehicleServiceDocument")
+    DocumentPreviewJob = apps.get_model("vehicle", "DocumentPreviewJob")
+    names = VehicleServiceDocument.objects.values_list("document", flat=True)
+    DocumentPreviewJob.objects.bulk_create(
+        [DocumentPreviewJob(document=name) for name in set(names)],
+        ignore_conflicts=True,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0008_document_storage"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="vehicleservicedocument",
+            name="preview",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                max_length=255,
+                storage=vehicle.storage.ContentAddressedStorage(),
+                upload_to="",
+            ),
+        ),
+        migrations.AddField(
+            model_name="vehicleservicedocument",
+            name="thumbnail",
+            field=models.FileField(
+                blank=True,
+                editable=False,
+                max_length=255,
+                storage=vehicle.storage.ContentAddressedStorage(),
+                upload_to="",
+            ),
+        ),
+        migrations.CreateModel(
+            name="DocumentPreviewJob",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("document", models.CharField(max_length=255, unique=True)),
+                (
+                    "status",
+                    models.CharField(
+                        choices=[
+                            ("pending", "Pending"),
+                            ("running", "Running"),
+                            ("done", "Done"),
+                            ("unsupported", "Unsupported"),
+                            ("failed", "Failed"),
+                        ],
+                        default="pending",
+                        max_length=12,
+                    ),
+                ),
+                ("attempts", models.PositiveSmallIntegerField(default=0)),
+                ("error", models.TextField(blank=True)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                ("claimed_at", models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["status", "id"], name="previewjob_status_id")
+                ],
+            },
+        ),
+        migrations.RunPython(queue_existing_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0009_document_previews"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ServiceReminder",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "service_type",
+                    models.CharField(
+                        choices=[
+                            ("maintenance", "Regular Maintenance"),
+                            ("repair", "Repair"),
+                            ("inspection", "Inspection"),
+                            ("oil_change", "Oil Change"),
+                            ("tire_change", "Tire Change"),
+                            ("other", "Other"),
+                        ],
+                        max_length=20,
+                    ),
+                ),
+                ("last_service_date", models.DateField()),
+                ("last_mileage", models.PositiveIntegerField(blank=True, null=True)),
+                (
+                    "km_per_day",
+                    models.DecimalField(
+                        blank=True, decimal_places=2, max_digits=8, null=True
+                    ),
+                ),
+                (
+                    "estimated_mileage",
+                    models.PositiveIntegerField(blank=True, null=True),
+                ),
+                ("due_mileage", models.PositiveIntegerField(blank=True, null=True)),
+                ("due_date", models.DateField()),
+                ("refreshed_on", models.DateField()),
+                (
+                    "vehicle",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reminders",
+                        to="vehicle.vehicle",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ["due_date"],
+                "indexes": [
+                    models.Index(fields=["due_date"], name="reminder_due_date")
+                ],
+                "constraints": [
+                    models.UniqueConstraint(
+                        fields=("vehicle", "service_type"), name="reminder_vehicle_type"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,65 @@
+# Generated by Django 5.2.4 on 2026-10-18 03:51
+
+from django.db import migrations
+
+# A copy of vehicle.search.SEARCH_INDEX_SQL as of this migration, so later
+# changes to the live module cannot change what it creates
+SEARCH_INDEX_SQL = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS vehicle_servicepart_search USING fts5(
+        part_name, content='vehicle_servicepart', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS vehicle_servicepart_search_insert
+    AFTER INSERT ON vehicle_servicepart BEGIN
+        INSERT INTO vehicle_servicepart_search(rowid, part_name)
+        VALUES (new.id, new.part_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vehicle_servicepart_search_delete
+    AFTER DELETE ON vehicle_servicepart BEGIN
+        INSERT INTO vehicle_servicepart_search(
+            vehicle_servicepart_search, rowid, part_name
+        )
+        VALUES ('delete', old.id, old.part_name);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS vehicle_servicepart_search_update
+    AFTER UPDATE OF part_name ON vehicle_servicepart BEGIN
+        INSERT INTO vehicle_servicepart_search(
+            vehicle_servicepart_search, rowid, part_name
+        )
+        VALUES ('delete', old.id, old.part_name);
+        INSERT INTO vehicle_servicepart_search(rowid, part_name)
+        VALUES (new.id, new.part_name);
+    END""",
+    """INSERT INTO vehicle_servicepart_search(vehicle_servicepart_search)
+    VALUES ('rebuild')""",
+]
+
+DROP_SEARCH_INDEX_SQL = [
+    "DROP TRIGGER IF EXISTS vehicle_servicepart_search_insert",
+    "DROP TRIGGER IF EXISTS vehicle_servicepart_search_delete",
+    "DROP TRIGGER IF EXISTS vehicle_servicepart_search_update",
+    "DROP TABLE IF EXISTS vehicle_servicepart_search",
+]
+
+
+def run_on_sqlite(statements):
+    # Other databases search with icontains and need no index
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor == "sqlite":
+            for sql in statements:
+                schema_editor.execute(sql, params=None)
+
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("vehicle", "0010_service_reminders"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_on_sqlite(SEARCH_INDEX_SQL), run_on_sqlite(DROP_SEARCH_INDEX_SQL)
+        ),
+    ]
@@ -1,9 +1,134 @@
-from django.db import models
+import os
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import Count, DecimalField, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .cache import bump_analytics_version
+from .storage import document_storage, preview_names
+
+
+def latest_service_fields():
+    """Subqueries for the date and mileage of a vehicle's latest service."""
+    latest = VehicleService.objects.filter(vehicle=OuterRef("pk")).order_by(
+        "-service_date", "-id"
+    )
+    return dict(
+        last_service_date=Subquery(latest.values("service_date")[:1]),
+        last_mileage=Subquery(
+            latest.filter(mileage__isnull=False).values("mileage")[:1]
+        ),
+    )
+
+
+class VehicleManager(models.Manager):
+    def apply(self, added=(), removed=()):
+        """Add and subtract services and parts to their vehicle totals.
+
+        Counts and costs are updated with deltas. The latest service date and
+        mileage are re-read for vehicles whose services changed, since a
+        removed or re-dated service can't be subtracted from a maximum.
+        """
+        deltas = defaultdict(lambda: defaultdict(int))
+        dated = set()
+        for sign, items in ((1, added), (-1, removed)):
+            for item in items:
+                if isinstance(item, VehicleService):
+                    vehicle_id, count, cost = (
+                        item.vehicle_id,
+                        "service_count",
+                        "service_cost",
+                    )
+                    amount = item.cost
+                    dated.add(vehicle_id)
+                else:
+                    vehicle_id, count, cost = (
+                        item.service.vehicle_id,
+                        "part_count",
+                        "parts_cost",
+                    )
+                    amount = item.total_cost
+                deltas[vehicle_id][count] += sign
+                deltas[vehicle_id][cost] += sign * Decimal(str(amount))
+
+        with transaction.atomic():
+            for vehicle_id, changes in deltas.items():
+                changes = {
+                    field: F(field) + delta for field, delta in changes.items() if delta
+                }
+                if changes:
+                    self.filter(pk=vehicle_id).update(**changes)
+            if dated:
+                self.filter(pk__in=dated).update(**latest_service_fields())
+
+    def refresh(self, vehicle_ids=None):
+        """Recompute the totals of ``vehicle_ids`` (or every vehicle) in SQL."""
+        services = (
+            VehicleService.objects.filter(vehicle=OuterRef("pk"))
+            .order_by()
+            .values("vehicle")
+        )
+        parts = (
+            ServicePart.objects.filter(service__vehicle=OuterRef("pk"))
+            .order_by()
+            .values("service__vehicle")
+        )
+        amount = DecimalField(max_digits=14, decimal_places=2)
+        vehicles = (
+            self.all() if vehicle_ids is None else self.filter(pk__in=vehicle_ids)
+        )
+        return vehicles.update(
+            service_count=Coalesce(
+                Subquery(services.annotate(total=Count("id")).values("total")), 0
+            ),
+            service_cost=Coalesce(
+                Subquery(services.annotate(total=Sum("cost")).values("total")),
+                Value(Decimal(0)),
+                output_field=amount,
+            ),
+            part_count=Coalesce(
+                Subquery(parts.annotate(total=Count("id")).values("total")), 0
+            ),
+            parts_cost=Coalesce(
+                Subquery(parts.annotate(total=Sum("total_cost")).values("total")),
+                Value(Decimal(0)),
+                output_field=amount,
+            ),
+            **latest_service_fields(),
+        )
 
 
 class Vehicle(models.Model):
     name = models.CharField(max_length=100)
     plate_number = models.CharField(max_length=20)
+    # Lifetime totals kept up to date by VehicleService and ServicePart writes
+    service_count = models.PositiveIntegerField(default=0, editable=False)
+    service_cost = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False
+    )
+    part_count = models.PositiveIntegerField(default=0, editable=False)
+    parts_cost = models.DecimalField(
+        max_digits=14, decimal_places=2, default=0, editable=False
+    )
+    last_service_date = models.DateField(null=True, blank=True, editable=False)
+    last_mileage = models.PositiveIntegerField(null=True, blank=True, editable=False)
+
+    objects = VehicleManager()
+
+    class Meta:
+        indexes = [
+            # Ordering and lookups for the admin autocomplete search
+            models.Index(fields=["name"], name="vehicle_name"),
+            models.Index(fields=["plate_number"], name="vehicle_plate_number"),
+        ]
+
+    @property
+    def total_cost(self):
+        return self.service_cost + self.parts_cost
 
     def __str__(self):
         return f"{self.name}"
@@ -15,6 +140,10 @@ class Garage(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["name"], name="garage_name"),
+            models.Index(fields=["location"], name="garage_location"),
+        ]
         verbose_name = "Garage"
         verbose_name_plural = "Garages"
 
@@ -28,13 +157,39 @@ class Shop(models.Model):
 
     class Meta:
         ordering = ["name"]
+        indexes = [
+            models.Index(fields=["name"], name="shop_name"),
+            models.Index(fields=["location"], name="shop_location"),
+        ]
         verbose_name = "Shop"
         verbose_name_plural = "Shops"
 
+    def delete(self, *args, **kwargs):
+        # Parts sold by the shop are deleted with it
+        with transaction.atomic():
+            Vehicle.objects.apply(removed=self.parts_sold.select_related("service"))
+            transaction.on_commit(bump_analytics_version)
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.name} - {self.location}"
 
 
+class VehicleServiceQuerySet(models.QuerySet):
+    def with_totals(self):
+        """Annotate ``parts_total`` and ``total_with_parts`` in SQL."""
+        amount = DecimalField(max_digits=12, decimal_places=2)
+        return self.annotate(
+            parts_total=Coalesce(
+                Sum("parts__total_cost"), Value(Decimal(0)), output_field=amount
+            )
+        ).annotate(
+            total_with_parts=models.ExpressionWrapper(
+                F("cost") + F("parts_total"), output_field=amount
+            )
+        )
+
+
 class VehicleService(models.Model):
     SERVICE_TYPES = [
         ("maintenance", "Regular Maintenance"),
@@ -65,11 +220,42 @@ class VehicleService(models.Model):
         related_name="services",
     )
 
+    objects = VehicleServiceQuerySet.as_manager()
+
     class Meta:
         ordering = ["-service_date"]
+        indexes = [
+            # Per-vehicle mileage order for the analytics report
+            models.Index(
+                fields=["vehicle", "service_date"], name="vehicleservice_vehicle_date"
+            ),
+        ]
         verbose_name = "Vehicle Service"
         verbose_name_plural = "Vehicle Services"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = VehicleService.objects.filter(pk=self.pk).first()
+            super().save(*args, **kwargs)
+            if previous and previous.vehicle_id != self.vehicle_id:
+                # The parts move to the other vehicle along with the service
+                Vehicle.objects.refresh([previous.vehicle_id, self.vehicle_id])
+            else:
+                Vehicle.objects.apply(
+                    added=[self], removed=[previous] if previous else []
+                )
+            transaction.on_commit(bump_analytics_version)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            parts = list(self.parts.select_related("service"))
+            result = super().delete(*args, **kwargs)
+            Vehicle.objects.apply(removed=[self, *parts])
+            transaction.on_commit(bump_analytics_version)
+            return result
+
     def __str__(self):
         return f"{self.vehicle} - {self.service_date} "
 
@@ -88,15 +274,233 @@ class ServicePart(models.Model):
         verbose_name = "Service Part"
         verbose_name_plural = "Service Parts"
 
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    ServicePart.objects.select_related("service")
+                    .filter(pk=self.pk)
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            Vehicle.objects.apply(added=[self], removed=[previous] if previous else [])
+            transaction.on_commit(bump_analytics_version)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            Vehicle.objects.apply(removed=[self])
+            transaction.on_commit(bump_analytics_version)
+            return super().delete(*args, **kwargs)
+
     def __str__(self):
         return f"{self.service} - {self.part_name} (x{self.quantity})"
 
 
+class ServiceReminderQuerySet(models.QuerySet):
+    def overdue(self, today):
+        return self.filter(due_date__lte=today)
+
+
+class ServiceReminder(models.Model):
+    """The next due date of a recurring service type for a vehicle.
+
+    Computed for all vehicles at once by the refresh_service_reminders
+    command; see vehicle.reminders.
+    """
+
+    vehicle = models.ForeignKey(
+        Vehicle, on_delete=models.CASCADE, related_name="reminders"
+    )
+    service_type = models.CharField(max_length=20, choices=VehicleService.SERVICE_TYPES)
+    last_service_date = models.DateField()
+    last_mileage = models.PositiveIntegerField(null=True, blank=True)
+    km_per_day = models.DecimalField(
+        max_digits=8, decimal_places=2, null=True, blank=True
+    )
+    estimated_mileage = models.PositiveIntegerField(null=True, blank=True)
+    due_mileage = models.PositiveIntegerField(null=True, blank=True)
+    due_date = models.DateField()
+    refreshed_on = models.DateField()
+
+    objects = ServiceReminderQuerySet.as_manager()
+
+    class Meta:
+        ordering = ["due_date"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["vehicle", "service_type"], name="reminder_vehicle_type"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["due_date"], name="reminder_due_date"),
+        ]
+
+    def __str__(self):
+        return f"{self.vehicle} - {self.get_service_type_display()}"
+
+
+def delete_orphaned_document(name):
+    """Delete the blob ``name`` and its previews once no document uses it.
+
+    References are checked under the blob lock an upload of the same content
+    holds until its document row is committed. Returns whether the blob was
+    deleted.
+    """
+    if not name:
+        return False
+    with transaction.atomic():
+        DocumentBlob.objects.lock(name)
+        if VehicleServiceDocument.objects.filter(document=name).exists():
+            return False
+        document_storage.delete(name)
+        for preview in preview_names(name):
+            document_storage.delete(preview)
+        DocumentPreviewJob.objects.filter(document=name).delete()
+        DocumentBlob.objects.filter(name=name).delete()
+    return True
+
+
+class DocumentBlobManager(models.Manager):
+    def lock(self, name):
+        """Lock the blob ``name`` until the end of the current transaction."""
+        # A delete that held the lock may remove the row under a waiting
+        # update, which then updates nothing and has to create it again
+        while not self.filter(name=name).update(name=name):
+            self.bulk_create([self.model(name=name)], ignore_conflicts=True)
+
+
+class DocumentBlob(models.Model):
+    """Lock row of a stored blob.
+
+    Uploads hold it from storing the blob until their document row is
+    committed, and deletes hold it while they re-check the references, so a
+    blob is never deleted under an upload of the same content.
+    """
+
+    name = models.CharField(max_length=255, unique=True)
+
+    objects = DocumentBlobManager()
+
+    def __str__(self):
+        return self.name
+
+
 class VehicleServiceDocument(models.Model):
     service = models.ForeignKey(
         VehicleService, on_delete=models.CASCADE, related_name="documents"
     )
-    document = models.FileField(upload_to="vehicle_service_docs/")
+    # Stored once per distinct content and shared between documents; the
+    # column is indexed to count the references to a blob
+    document = models.FileField(
+        upload_to="vehicle_service_docs/",
+        storage=document_storage,
+        max_length=255,
+        db_index=True,
+    )
+    original_name = models.CharField(max_length=255, blank=True, editable=False)
+    # Rendered next to the blob by the process_document_previews worker
+    thumbnail = models.FileField(
+        storage=document_storage, max_length=255, blank=True, editable=False
+    )
+    preview = models.FileField(
+        storage=document_storage, max_length=255, blank=True, editable=False
+    )
+
+    def save(self, *args, **kwargs):
+        uploaded = bool(self.document) and not self.document._committed
+        if uploaded:
+            self.original_name = os.path.basename(self.document.name)
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    VehicleServiceDocument.objects.filter(pk=self.pk)
+                    .values_list("document", flat=True)
+                    .first()
+                )
+            if uploaded:
+                self.thumbnail = self.preview = ""
+                # Locked before the blob is stored, so a release of the same
+                # content either finishes first or sees this document
+                name = self.document.field.generate_filename(self, self.document.name)
+                DocumentBlob.objects.lock(
+                    document_storage.content_name(name, self.document.file)
+                )
+            super().save(*args, **kwargs)
+            if uploaded:
+                self.attach_previews()
+            if previous and previous != self.document.name:
+                transaction.on_commit(lambda: delete_orphaned_document(previous))
+
+    def attach_previews(self):
+        """Reuse the previews of an already stored blob, or queue them."""
+        rendered = (
+            VehicleServiceDocument.objects.filter(document=self.document.name)
+            .exclude(thumbnail="")
+            .values("thumbnail", "preview")
+            .first()
+        )
+        if rendered:
+            VehicleServiceDocument.objects.filter(pk=self.pk).update(**rendered)
+            self.thumbnail, self.preview = rendered["thumbnail"], rendered["preview"]
+        else:
+            DocumentPreviewJob.objects.enqueue([self.document.name])
+
+    def __str__(self):
+        return f"{self.service} - {self.original_name or self.document.name}"
+
+
+@receiver(post_delete, sender=VehicleServiceDocument)
+def release_document(sender, instance, **kwargs):
+    # A signal rather than delete() so documents removed by cascading
+    # service and vehicle deletes release their blobs too
+    name = instance.document.name
+    transaction.on_commit(lambda: delete_orphaned_document(name))
+
+
+class DocumentPreviewJobManager(models.Manager):
+    def enqueue(self, names):
+        """Queue preview rendering for the blobs ``names``."""
+        self.bulk_create(
+            [self.model(document=name) for name in names], ignore_conflicts=True
+        )
+
+
+class DocumentPreviewJob(models.Model):
+    """A blob waiting for, or done with, preview rendering.
+
+    Rows are claimed by the process_document_previews worker, so uploads
+    never wait for rendering and no external broker is needed.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    UNSUPPORTED = "unsupported"
+    FAILED = "failed"
+
+    STATUSES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (DONE, "Done"),
+        (UNSUPPORTED, "Unsupported"),
+        (FAILED, "Failed"),
+    ]
+
+    document = models.CharField(max_length=255, unique=True)
+    status = models.CharField(max_length=12, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+
+    objects = DocumentPreviewJobManager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="previewjob_status_id"),
+        ]
 
     def __str__(self):
-        return f"{self.service} - {self.document.name}"
+        return f"{self.document} ({self.status})"
@@ -0,0 +1,143 @@
+import datetime
+import os
+import shutil
+import subprocess
+import tempfile
+import uuid
+
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .models import DocumentPreviewJob, VehicleServiceDocument
+from .storage import document_storage, preview_names
+
+THUMBNAIL_SIZE = (160, 160)
+PREVIEW_SIZE = (1024, 1024)
+IMAGE_EXTENSIONS = {".bmp", ".gif", ".jpeg", ".jpg", ".png", ".tif", ".tiff", ".webp"}
+PDF_RENDER_TIMEOUT = 60
+MAX_ATTEMPTS = 3
+# Jobs left running this long belong to a worker that died
+STALE_CLAIM = datetime.timedelta(minutes=10)
+
+
+class UnsupportedDocument(Exception):
+    pass
+
+
+def open_first_page(path):
+    """The first page of the image or PDF at ``path`` as an RGB image."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        with Image.open(path) as image:
+            image.seek(0)
+            return ImageOps.exif_transpose(image).convert("RGB")
+    if extension == ".pdf":
+        pdftoppm = shutil.which("pdftoppm")
+        if pdftoppm is None:
+            raise UnsupportedDocument("pdftoppm (poppler) is not installed")
+        with tempfile.TemporaryDirectory() as directory:
+            output = os.path.join(directory, "page")
+            subprocess.run(
+                [
+                    pdftoppm,
+                    "-png",
+                    "-singlefile",
+                    "-f",
+                    "1",
+                    "-l",
+                    "1",
+                    "-scale-to",
+                    str(max(PREVIEW_SIZE)),
+                    path,
+                    output,
+                ],
+                check=True,
+                capture_output=True,
+                timeout=PDF_RENDER_TIMEOUT,
+            )
+            with Image.open(output + ".png") as image:
+                return image.convert("RGB")
+    raise UnsupportedDocument(f"No preview for {extension or 'extensionless'} files")
+
+
+def write_image(image, name):
+    """Write ``image`` as PNG to ``name`` in the document storage, atomically."""
+    path = document_storage.path(name)
+    temporary = os.path.join(os.path.dirname(path), f".upload-{uuid.uuid4().hex}")
+    image.save(temporary, "PNG", optimize=True)
+    os.replace(temporary, path)
+    document_storage._chmod(name)
+
+
+def render_previews(name):
+    """Render the thumbnail and preview of the blob ``name``."""
+    page = open_first_page(document_storage.path(name))
+    thumbnail, preview = preview_names(name)
+    page.thumbnail(PREVIEW_SIZE)
+    write_image(page, preview)
+    page.thumbnail(THUMBNAIL_SIZE)
+    write_image(page, thumbnail)
+    return thumbnail, preview
+
+
+def claim_jobs(limit):
+    """Mark up to ``limit`` queued jobs as running for this worker.
+
+    Each claim is a conditional UPDATE, so concurrent workers never render
+    the same blob twice.
+    """
+    now = timezone.now()
+    claimable = Q(status=DocumentPreviewJob.PENDING) | Q(
+        status=DocumentPreviewJob.RUNNING, claimed_at__lt=now - STALE_CLAIM
+    )
+    claimed = []
+    for job in DocumentPreviewJob.objects.filter(claimable).order_by("id")[:limit]:
+        updated = DocumentPreviewJob.objects.filter(
+            claimable, pk=job.pk, status=job.status
+        ).update(
+            status=DocumentPreviewJob.RUNNING,
+            claimed_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if updated:
+            job.attempts += 1
+            claimed.append(job)
+    return claimed
+
+
+def process_job(job):
+    """Render the previews of ``job`` and attach them to its documents."""
+    try:
+        thumbnail, preview = render_previews(job.document)
+    except FileNotFoundError:
+        # The blob was released while the job was queued
+        DocumentPreviewJob.objects.filter(pk=job.pk).delete()
+        return None
+    except UnsupportedDocument as exc:
+        job.status, job.error = DocumentPreviewJob.UNSUPPORTED, str(exc)
+    except Exception as exc:
+        job.error = f"{type(exc).__name__}: {exc}"
+        job.status = (
+            DocumentPreviewJob.FAILED
+            if job.attempts >= MAX_ATTEMPTS
+            else DocumentPreviewJob.PENDING
+        )
+    else:
+        with transaction.atomic():
+            VehicleServiceDocument.objects.filter(document=job.document).update(
+                thumbnail=thumbnail, preview=preview
+            )
+            job.status, job.error = DocumentPreviewJob.DONE, ""
+            save_status(job)
+        return job
+    save_status(job)
+    return job
+
+
+def save_status(job):
+    # An update rather than save(), the job is gone if its blob was released
+    DocumentPreviewJob.objects.filter(pk=job.pk).update(
+        status=job.status, error=job.error
+    )
@@ -0,0 +1,107 @@
+import datetime
+import math
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Min
+
+from .models import ServiceReminder, VehicleService
+
+# Days and kilometres between services of each type; None disables a limit.
+# Repairs and other one-off work are not scheduled.
+SERVICE_INTERVALS = {
+    "oil_change": (180, 5000),
+    "maintenance": (365, 10000),
+    "tire_change": (4 * 365, 40000),
+    "inspection": (365, None),
+}
+
+
+def mileage_rates():
+    """Kilometres per day of each vehicle, from its recorded mileages.
+
+    Returns ``{vehicle_id: (rate, date, mileage)}`` where ``date`` and
+    ``mileage`` are the latest reading, to extrapolate from. Vehicles with
+    fewer than two readings on different days have no rate.
+    """
+    rows = (
+        VehicleService.objects.filter(mileage__isnull=False)
+        .values("vehicle")
+        .annotate(
+            first_date=Min("service_date"),
+            last_date=Max("service_date"),
+            low=Min("mileage"),
+            high=Max("mileage"),
+        )
+        .order_by()
+    )
+    rates = {}
+    for row in rows:
+        days = (row["last_date"] - row["first_date"]).days
+        if days > 0:
+            rates[row["vehicle"]] = (
+                (row["high"] - row["low"]) / days,
+                row["last_date"],
+                row["high"],
+            )
+    return rates
+
+
+def build_reminders(today):
+    """Unsaved reminders for every vehicle and scheduled service type.
+
+    Two grouped queries cover all vehicles. A service is due at the earlier
+    of its date interval and the day the estimated mileage reaches its km
+    interval.
+    """
+    rates = mileage_rates()
+    last_services = (
+        VehicleService.objects.filter(service_type__in=SERVICE_INTERVALS)
+        .values("vehicle", "service_type")
+        .annotate(last_date=Max("service_date"), last_mileage=Max("mileage"))
+        .order_by()
+    )
+    reminders = []
+    for row in last_services:
+        days, km = SERVICE_INTERVALS[row["service_type"]]
+        rate, reading_date, reading = rates.get(row["vehicle"], (None, None, None))
+        candidates = []
+        if days is not None:
+            candidates.append(row["last_date"] + datetime.timedelta(days=days))
+        due_mileage = None
+        if km is not None and row["last_mileage"] is not None:
+            due_mileage = row["last_mileage"] + km
+            if rate:
+                remaining = max(due_mileage - reading, 0)
+                candidates.append(
+                    reading_date + datetime.timedelta(days=math.ceil(remaining / rate))
+                )
+        if not candidates:
+            continue
+        reminders.append(
+            ServiceReminder(
+                vehicle_id=row["vehicle"],
+                service_type=row["service_type"],
+                last_service_date=row["last_date"],
+                last_mileage=row["last_mileage"],
+                km_per_day=(Decimal(rate).quantize(Decimal("0.01")) if rate else None),
+                estimated_mileage=(
+                    round(reading + rate * max((today - reading_date).days, 0))
+                    if rate
+                    else None
+                ),
+                due_mileage=due_mileage,
+                due_date=min(candidates),
+                refreshed_on=today,
+            )
+        )
+    return reminders
+
+
+def refresh_reminders(today):
+    """Replace the stored reminders with ones computed as of ``today``."""
+    reminders = build_reminders(today)
+    with transaction.atomic():
+        ServiceReminder.objects.all().delete()
+        ServiceReminder.objects.bulk_create(reminders, batch_size=1000)
+    return reminders
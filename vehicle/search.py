@@ -0,0 +1,172 @@
+from django.db import connections
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    FloatField,
+    Max,
+    Min,
+    Q,
+    Window,
+)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast, Round, RowNumber
+
+from .models import ServicePart
+
+SEARCH_TABLE = "vehicle_servicepart_search"
+# The trigram tokenizer matches any substring of three or more characters,
+# case-insensitively, like the icontains lookup it replaces
+MIN_TERM_LENGTH = 3
+HISTORY_LIMIT = 200
+
+UNIT_COST = DecimalField(max_digits=12, decimal_places=2)
+
+# The FTS5 table stores no text of its own (content=), triggers keep its
+# index in step with vehicle_servicepart. Django rebuilds SQLite tables on
+# most ALTER TABLEs, dropping the triggers: repair_search_index puts them
+# back after every migrate. Migration 0011 has its own copy of this SQL.
+SEARCH_INDEX_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+        part_name, content='vehicle_servicepart', content_rowid='id',
+        tokenize='trigram'
+    )""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_insert
+    AFTER INSERT ON vehicle_servicepart BEGIN
+        INSERT INTO {SEARCH_TABLE}(rowid, part_name)
+        VALUES (new.id, new.part_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_delete
+    AFTER DELETE ON vehicle_servicepart BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, part_name)
+        VALUES ('delete', old.id, old.part_name);
+    END""",
+    f"""CREATE TRIGGER IF NOT EXISTS {SEARCH_TABLE}_update
+    AFTER UPDATE OF part_name ON vehicle_servicepart BEGIN
+        INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rowid, part_name)
+        VALUES ('delete', old.id, old.part_name);
+        INSERT INTO {SEARCH_TABLE}(rowid, part_name)
+        VALUES (new.id, new.part_name);
+    END""",
+    f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}) VALUES ('rebuild')",
+]
+
+SEARCH_TRIGGERS = [
+    f"{SEARCH_TABLE}_{event}" for event in ("insert", "delete", "update")
+]
+
+DROP_SEARCH_INDEX_SQL = [
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_insert",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_delete",
+    f"DROP TRIGGER IF EXISTS {SEARCH_TABLE}_update",
+    f"DROP TABLE IF EXISTS {SEARCH_TABLE}",
+]
+
+
+def install_search_index(connection):
+    """Create or rebuild the part name index. Other databases scan instead."""
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in SEARCH_INDEX_SQL:
+            cursor.execute(sql)
+
+
+def drop_search_index(connection):
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for sql in DROP_SEARCH_INDEX_SQL:
+            cursor.execute(sql)
+
+
+def repair_search_index(using, **kwargs):
+    """``post_migrate`` handler reinstalling triggers dropped by migrations.
+
+    Only databases that have the index are repaired; the reinstall rebuilds
+    the index from the current part names.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT name FROM sqlite_master WHERE name IN ({})".format(
+                ", ".join(["%s"] * (len(SEARCH_TRIGGERS) + 1))
+            ),
+            [SEARCH_TABLE, *SEARCH_TRIGGERS],
+        )
+        installed = {name for (name,) in cursor.fetchall()}
+    if SEARCH_TABLE in installed and not installed.issuperset(SEARCH_TRIGGERS):
+        install_search_index(connection)
+
+
+def search_parts(queryset, query):
+    """Parts of ``queryset`` whose name contains every word of ``query``."""
+    terms = query.split()
+    if not terms:
+        return queryset.none()
+    vendor = connections[queryset.db].vendor
+    if vendor == "sqlite" and all(len(term) >= MIN_TERM_LENGTH for term in terms):
+        match = " ".join('"{}"'.format(term.replace('"', '""')) for term in terms)
+        return queryset.filter(
+            id__in=RawSQL(
+                f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s",
+                [match],
+            )
+        )
+    condition = Q()
+    for term in terms:
+        condition &= Q(part_name__icontains=term)
+    return queryset.filter(condition)
+
+
+def price_history(query, limit=HISTORY_LIMIT):
+    """Unit costs paid for parts matching ``query``, per shop and over time.
+
+    Returns the latest purchases and, per shop, the number of purchases,
+    the lowest and highest unit cost and the last purchase, in three
+    queries driven by the search index.
+    """
+    parts = search_parts(ServicePart.objects.all(), query).annotate(
+        # SQLite divides whole-number decimals as integers
+        unit_cost=Round(
+            ExpressionWrapper(
+                F("total_cost") / Cast("quantity", FloatField()),
+                output_field=UNIT_COST,
+            ),
+            2,
+        )
+    )
+    latest = [F("service__service_date").desc(), F("id").desc()]
+    history = list(
+        parts.select_related("shop", "service__vehicle").order_by(*latest)[:limit]
+    )
+    shops = {
+        row["shop"]: row
+        for row in parts.values("shop")
+        .annotate(
+            purchases=Count("id"),
+            lowest=Min("unit_cost"),
+            highest=Max("unit_cost"),
+        )
+        .order_by()
+    }
+    last_purchases = (
+        parts.annotate(
+            row=Window(RowNumber(), partition_by=[F("shop")], order_by=latest)
+        )
+        .filter(row=1)
+        .select_related("shop", "service")
+    )
+    for part in last_purchases:
+        shops[part.shop_id]["last"] = part
+    return {
+        "history": history,
+        "shops": sorted(
+            shops.values(),
+            key=lambda row: row["last"].service.service_date,
+            reverse=True,
+        ),
+    }
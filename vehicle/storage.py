@@ -0,0 +1,96 @@
+import hashlib
+import os
+import uuid
+
+from django.core.files.move import file_move_safe
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """File system storage that keeps one copy of each distinct file.
+
+    Uploads are streamed to disk in chunks while being hashed and stored as
+    ``<upload dir>/<aa>/<bb>/<sha256><ext>``. Saving content that is already
+    stored writes nothing and returns the existing name, so several records
+    can share one blob. Deleting a blob is left to the callers, which know
+    whether any record still references it.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # Names are derived from the content in _save, an existing file with
+        # the same name already holds the same bytes
+        return name
+
+    def blob_name(self, name, digest):
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        return os.path.join(directory, digest[:2], digest[2:4], digest + extension)
+
+    def content_digest(self, content):
+        """SHA-256 of ``content``, kept on it so an upload is hashed once."""
+        digest = getattr(content, "content_digest", None)
+        if digest is None:
+            sha256 = hashlib.sha256()
+            for chunk in content.chunks():
+                sha256.update(chunk)
+            digest = content.content_digest = sha256.hexdigest()
+        return digest
+
+    def content_name(self, name, content):
+        """Name ``content`` is stored under when saved as ``name``."""
+        return self.blob_name(name, self.content_digest(content)).replace("\\", "/")
+
+    def _save(self, name, content):
+        digest = getattr(content, "content_digest", None)
+        if digest is not None and self.exists(self.blob_name(name, digest)):
+            # Hashed by content_name before, and already stored
+            return self.blob_name(name, digest).replace("\\", "/")
+
+        if hasattr(content, "temporary_file_path"):
+            # Large uploads are already on disk: hash them and move the file
+            # into place instead of copying it
+            blob = self.blob_name(name, self.content_digest(content))
+            if not self.exists(blob):
+                os.makedirs(os.path.dirname(self.path(blob)), exist_ok=True)
+                try:
+                    file_move_safe(content.temporary_file_path(), self.path(blob))
+                except FileExistsError:
+                    # Stored by a concurrent upload of the same content
+                    return blob.replace("\\", "/")
+                self._chmod(blob)
+            return blob.replace("\\", "/")
+
+        directory = os.path.dirname(self.path(name))
+        os.makedirs(directory, exist_ok=True)
+        temporary = os.path.join(directory, f".upload-{uuid.uuid4().hex}")
+        sha256 = hashlib.sha256() if digest is None else None
+        # Created like FileSystemStorage files so the default permissions apply
+        fd = os.open(temporary, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666)
+        with os.fdopen(fd, "wb") as handle:
+            for chunk in content.chunks():
+                if sha256 is not None:
+                    sha256.update(chunk)
+                handle.write(chunk)
+        blob = self.blob_name(name, digest or sha256.hexdigest())
+        if self.exists(blob):
+            os.remove(temporary)
+        else:
+            os.makedirs(os.path.dirname(self.path(blob)), exist_ok=True)
+            os.replace(temporary, self.path(blob))
+            self._chmod(blob)
+        return blob.replace("\\", "/")
+
+    def _chmod(self, name):
+        if self.file_permissions_mode is not None:
+            os.chmod(self.path(name), self.file_permissions_mode)
+
+
+def preview_names(name):
+    """Names of the thumbnail and first page preview rendered for ``name``."""
+    stem = os.path.splitext(name)[0]
+    return f"{stem}.thumb.png", f"{stem}.preview.png"
+
+
+document_storage = ContentAddressedStorage()
@@ -1,3 +1,562 @@
-from django.test import TestCase
+import base64
+import datetime
+import hashlib
+import io
+import shutil
+import tempfile
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import Permission, User
+from django.core.files.uploadedfile import SimpleUploadedFile, TemporaryUploadedFile
+from django.core.management import call_command
+from django.core.management.sql import emit_post_migrate_signal
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from . import previews
+from .models import (
+    DocumentBlob,
+    DocumentPreviewJob,
+    Garage,
+    ServicePart,
+    ServiceReminder,
+    Shop,
+    Vehicle,
+    VehicleService,
+    VehicleServiceDocument,
+    delete_orphaned_document,
+)
+from .reminders import refresh_reminders
+from .search import SEARCH_TABLE, price_history, search_parts
+from .storage import document_storage
+
+# A 2x2 red PNG
+PNG = base64.b64decode(
+    "iVBORw0KGgoAAAANSUhEUgAAAAIAAAACCAIAAAD91JpzAAAAEElEQVR4nGP4z8AARAwQCgAf7gP9"
+    "i18U1AAAAABJRU5ErkJggg=="
+)
+
+
+class VehicleTestCase(TestCase):
+    """Base for the vehicle tests: an admin, a car and a parts shop."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser("admin", "admin@example.com", "pw")
+        cls.vehicle = Vehicle.objects.create(name="Car", plate_number="CAR-1234")
+        cls.shop = Shop.objects.create(name="Shop", location="Kandy")
+
+    @classmethod
+    def create_service(cls, date, cost="1000.00", **fields):
+        fields = {"vehicle": cls.vehicle, "description": "Service", **fields}
+        return VehicleService.objects.create(
+            service_date=date, cost=Decimal(cost), **fields
+        )
+
+
+class VehicleServiceChangelistTests(VehicleTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.garage = Garage.objects.create(name="Garage", location="Colombo")
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def create_services(self, count):
+        for i in range(count):
+            service = self.create_service(
+                datetime.date(2024, 1, 1) + datetime.timedelta(days=i),
+                garage=self.garage,
+            )
+            for name in ("Filter", "Oil"):
+                ServicePart.objects.create(
+                    service=service,
+                    shop=self.shop,
+                    part_name=name,
+                    total_cost=Decimal("250.50"),
+                )
+
+    def changelist(self, **params):
+        response = self.client.get(
+            reverse("admin:vehicle_vehicleservice_changelist"), params
+        )
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_page_query_count_is_constant(self):
+        # A full page ran 107 queries while every row loaded its own parts
+        self.create_services(2)
+        with self.assertNumQueries(8):
+            self.changelist()
+
+        self.create_services(23)
+        with self.assertNumQueries(8):
+            response = self.changelist()
+        self.assertEqual(len(response.context["cl"].result_list), 25)
+
+    def test_totals_are_annotated_and_sortable(self):
+        self.create_services(3)
+        VehicleService.objects.update(cost=Decimal("20000.00"))
+        VehicleService.objects.filter(service_date=datetime.date(2024, 1, 1)).update(
+            cost=Decimal("100.00")
+        )
+
+        response = self.changelist(o="6")
+        services = response.context["cl"].result_list
+        self.assertEqual(services[0].parts_total, Decimal("501.00"))
+        self.assertEqual(services[0].total_with_parts, Decimal("601.00"))
+        self.assertEqual(
+            [service.total_with_parts for service in services],
+            sorted(service.total_with_parts for service in services),
+        )
+
+        response = self.changelist(total_cost="lt10k")
+        self.assertEqual(len(response.context["cl"].result_list), 1)
+
+
+class VehicleAnalyticsTests(VehicleTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        for mileage, cost in ((1000, "500.00"), (1500, "300.00"), (2500, "700.00")):
+            cls.create_service(
+                datetime.date(2024, 1, 1) + datetime.timedelta(days=mileage),
+                cost,
+                mileage=mileage,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_cost_per_km_and_invalidation(self):
+        response = self.client.get(reverse("admin:vehicle-analytics"))
+        row = response.context["vehicles"][0]
+        self.assertEqual(row["lifetime"], Decimal("1500.00"))
+        self.assertEqual(row["km"], 1500)
+        # The 300 and 700 services cover the 1500 km after the first reading
+        self.assertEqual(row["cost_per_km"], Decimal("0.67"))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ServicePart.objects.create(
+                service=VehicleService.objects.get(mileage=2500),
+                shop=self.shop,
+                part_name="Tyre",
+                total_cost=Decimal("500.00"),
+            )
+        response = self.client.get(reverse("admin:vehicle-analytics"))
+        row = response.context["vehicles"][0]
+        self.assertEqual(row["lifetime"], Decimal("2000.00"))
+        self.assertEqual(row["cost_per_km"], Decimal("1.00"))
+        self.assertEqual(response.context["shops"][0]["lifetime"], Decimal("500.00"))
+
+    def test_requires_view_permission(self):
+        staff = User.objects.create_user("staff", is_staff=True)
+        self.client.force_login(staff)
+        url = reverse("admin:vehicle-analytics")
+        self.assertEqual(self.client.get(url).status_code, 403)
+        staff.user_permissions.add(
+            Permission.objects.get(codename="view_vehicleservice")
+        )
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+
+class VehicleTotalsTests(VehicleTestCase):
+    def assertTotals(self, **expected):
+        self.vehicle.refresh_from_db()
+        actual = {field: getattr(self.vehicle, field) for field in expected}
+        self.assertEqual(actual, expected)
+        # The incremental totals match a full recompute
+        Vehicle.objects.refresh()
+        self.vehicle.refresh_from_db()
+        self.assertEqual(
+            {field: getattr(self.vehicle, field) for field in expected}, expected
+        )
+
+    def test_totals_follow_service_and_part_writes(self):
+        first = self.create_service(datetime.date(2024, 1, 1), mileage=10000)
+        second = self.create_service(datetime.date(2024, 6, 1), "500.00", mileage=15000)
+        part = ServicePart.objects.create(
+            service=second, shop=self.shop, part_name="Oil", total_cost=Decimal("250")
+        )
+        self.assertTotals(
+            service_count=2,
+            service_cost=Decimal("1500.00"),
+            part_count=1,
+            parts_cost=Decimal("250.00"),
+            last_service_date=datetime.date(2024, 6, 1),
+            last_mileage=15000,
+        )
+
+        part.total_cost = Decimal("300")
+        part.save()
+        first.service_date = datetime.date(2024, 9, 1)
+        first.save()
+        self.assertTotals(
+            parts_cost=Decimal("300.00"),
+            last_service_date=datetime.date(2024, 9, 1),
+            last_mileage=10000,
+        )
+
+        first.delete()
+        second.delete()
+        self.assertTotals(
+            service_count=0,
+            service_cost=Decimal("0.00"),
+            part_count=0,
+            parts_cost=Decimal("0.00"),
+            last_service_date=None,
+            last_mileage=None,
+        )
+
+    def test_totals_follow_part_inline_edits(self):
+        service = self.create_service(datetime.date(2024, 1, 1))
+        part = ServicePart.objects.create(
+            service=service, shop=self.shop, part_name="Oil", total_cost=Decimal("250")
+        )
+        self.client.force_login(self.admin)
+        response = self.client.post(
+            reverse("admin:vehicle_vehicleservice_change", args=[service.pk]),
+            {
+                "vehicle": self.vehicle.pk,
+                "service_date": "2024-01-01",
+                "service_type": "maintenance",
+                "description": "Service",
+                "cost": "1000.00",
+                "mileage": "",
+                "garage": "",
+                "parts-TOTAL_FORMS": "2",
+                "parts-INITIAL_FORMS": "1",
+                "parts-0-id": part.pk,
+                "parts-0-service": service.pk,
+                "parts-0-shop": self.shop.pk,
+                "parts-0-part_name": "Oil",
+                "parts-0-quantity": "1",
+                "parts-0-total_cost": "250",
+                "parts-0-DELETE": "on",
+                "parts-1-service": service.pk,
+                "parts-1-shop": self.shop.pk,
+                "parts-1-part_name": "Filter",
+                "parts-1-quantity": "2",
+                "parts-1-total_cost": "400",
+                "documents-TOTAL_FORMS": "0",
+                "documents-INITIAL_FORMS": "0",
+            },
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertTotals(part_count=1, parts_cost=Decimal("400.00"))
+
+
+class VehicleServiceChangeFormTests(VehicleTestCase):
+    def test_related_selects_only_render_selected_options(self):
+        Vehicle.objects.create(name="Van", plate_number="VAN-5678")
+        shops = Shop.objects.bulk_create(
+            Shop(name=f"Shop {i:03d}", location="Kandy") for i in range(100)
+        )
+        service = self.create_service(datetime.date(2024, 1, 1))
+        for shop in shops[:10]:
+            ServicePart.objects.create(
+                service=service, shop=shop, part_name="Part", total_cost=Decimal("1")
+            )
+
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("admin:vehicle_vehicleservice_change", args=[service.pk])
+        )
+        self.assertContains(response, "Shop 009")
+        self.assertNotContains(response, "Shop 099")
+        self.assertNotContains(response, "VAN-5678")
+        self.assertNotContains(response, ">Van<")
+
+
+class DocumentStorageTests(VehicleTestCase):
+    def setUp(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        settings = override_settings(MEDIA_ROOT=media_root)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+        self.services = [
+            self.create_service(datetime.date(2024, 1, day)) for day in (1, 2)
+        ]
+
+    def upload(self, service, name, content=b"%PDF-1.4 receipt"):
+        return VehicleServiceDocument.objects.create(
+            service=service, document=SimpleUploadedFile(name, content)
+        )
+
+    def test_identical_uploads_share_one_blob(self):
+        first = self.upload(self.services[0], "receipt.pdf")
+        second = self.upload(self.services[1], "Receipt copy.PDF")
+        other = self.upload(self.services[1], "other.pdf", b"%PDF-1.4 other")
+
+        self.assertEqual(first.document.name, second.document.name)
+        self.assertNotEqual(first.document.name, other.document.name)
+        self.assertEqual(second.original_name, "Receipt copy.PDF")
+        with document_storage.open(first.document.name) as handle:
+            self.assertEqual(handle.read(), b"%PDF-1.4 receipt")
+
+    def test_blobs_are_deleted_with_their_last_reference(self):
+        first = self.upload(self.services[0], "receipt.pdf")
+        self.upload(self.services[1], "receipt.pdf")
+        name = first.document.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(document_storage.exists(name))
+
+        # Cascading delete of the service that holds the last reference
+        with self.captureOnCommitCallbacks(execute=True):
+            self.services[1].delete()
+        self.assertFalse(document_storage.exists(name))
+
+    def test_uploads_lock_their_blob_before_storing_it(self):
+        name = document_storage.content_name(
+            "vehicle_service_docs/receipt.pdf", SimpleUploadedFile("r", b"receipt")
+        )
+        store = document_storage._save
+
+        def locked_save(*args):
+            self.assertTrue(DocumentBlob.objects.filter(name=name).exists())
+            return store(*args)
+
+        with mock.patch.object(document_storage, "_save", side_effect=locked_save):
+            document = self.upload(self.services[0], "receipt.pdf", b"receipt")
+        self.assertEqual(document.document.name, name)
+
+    def test_uploads_are_hashed_once(self):
+        # Large uploads arrive as temporary files, small ones in memory
+        scan = TemporaryUploadedFile("scan.pdf", "application/pdf", 4, None)
+        scan.write(b"scan")
+        for upload, content in (
+            (SimpleUploadedFile("receipt.pdf", b"receipt"), b"receipt"),
+            (scan, b"scan"),
+        ):
+            with mock.patch(
+                "vehicle.storage.hashlib.sha256", wraps=hashlib.sha256
+            ) as sha256:
+                document = VehicleServiceDocument.objects.create(
+                    service=self.services[0], document=upload
+                )
+            self.assertEqual(sha256.call_count, 1)
+            with document_storage.open(document.document.name) as handle:
+                self.assertEqual(handle.read(), content)
+
+    def test_releases_recheck_references_under_the_lock(self):
+        first = self.upload(self.services[0], "receipt.pdf")
+        name = first.document.name
+        # A release that was queued before another upload of the content
+        self.upload(self.services[1], "copy.pdf")
+        VehicleServiceDocument.objects.filter(pk=first.pk).delete()
+        self.assertFalse(delete_orphaned_document(name))
+        self.assertTrue(document_storage.exists(name))
+
+        VehicleServiceDocument.objects.all().delete()
+        self.assertTrue(delete_orphaned_document(name))
+        self.assertFalse(document_storage.exists(name))
+        self.assertFalse(DocumentBlob.objects.filter(name=name).exists())
+
+    def test_cleanup_deletes_unreferenced_blobs(self):
+        kept = self.upload(self.services[0], "receipt.pdf").document.name
+        orphan = self.upload(self.services[1], "other.pdf", b"other").document.name
+        # Without on-commit callbacks the release never runs, as if the row
+        # was deleted outside the ORM
+        VehicleServiceDocument.objects.filter(document=orphan).delete()
+        call_command("cleanup_document_blobs", stdout=io.StringIO())
+        self.assertTrue(document_storage.exists(kept))
+        self.assertFalse(document_storage.exists(orphan))
+
+    def test_download_supports_ranges_and_conditional_requests(self):
+        document = self.upload(self.services[0], "receipt.pdf", b"0123456789")
+        self.client.force_login(self.admin)
+        url = reverse("vehicle-document-download", args=[document.pk])
+
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+        self.assertEqual(response["Content-Type"], "application/pdf")
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        etag = response["ETag"]
+
+        response = self.client.get(url, headers={"Range": "bytes=2-5"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b"".join(response.streaming_content), b"2345")
+        self.assertEqual(response["Content-Range"], "bytes 2-5/10")
+        self.assertEqual(response["Content-Length"], "4")
+
+        response = self.client.get(url, headers={"Range": "bytes=-3"})
+        self.assertEqual(b"".join(response.streaming_content), b"789")
+
+        response = self.client.get(url, headers={"Range": "bytes=20-"})
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], "bytes */10")
+
+        # An invalid range is ignored rather than refused
+        response = self.client.get(url, headers={"Range": "bytes=5-3"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b"".join(response.streaming_content), b"0123456789")
+
+        response = self.client.get(
+            url, headers={"Range": "bytes=2-5", "If-Range": '"stale"'}
+        )
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+
+    def test_download_requires_permission(self):
+        document = self.upload(self.services[0], "receipt.pdf")
+        url = reverse("vehicle-document-download", args=[document.pk])
+        self.assertEqual(self.client.get(url).status_code, 302)
+
+        staff = User.objects.create_user("staff", password="pw", is_staff=True)
+        self.client.force_login(staff)
+        self.assertEqual(self.client.get(url).status_code, 403)
+
+    def test_preview_jobs_are_queued_once_per_blob(self):
+        self.upload(self.services[0], "notes.txt", b"notes")
+        self.upload(self.services[1], "notes copy.txt", b"notes")
+
+        jobs = previews.claim_jobs(10)
+        self.assertEqual(len(jobs), 1)
+        self.assertEqual(previews.claim_jobs(10), [])
+        job = previews.process_job(jobs[0])
+        self.assertEqual(job.status, DocumentPreviewJob.UNSUPPORTED)
+        self.assertEqual(previews.claim_jobs(10), [])
+
+    def test_rendered_previews_are_shared_and_served(self):
+        first = self.upload(self.services[0], "photo.png", PNG)
+        previews.process_job(previews.claim_jobs(10)[0])
+        first.refresh_from_db()
+        self.assertTrue(document_storage.exists(first.thumbnail.name))
+
+        # A later upload of the same content reuses the rendered previews
+        second = self.upload(self.services[1], "photo copy.png", PNG)
+        self.assertEqual(second.thumbnail.name, first.thumbnail.name)
+        self.assertEqual(previews.claim_jobs(10), [])
+
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("vehicle-document-preview", args=[second.pk, "thumbnail"])
+        )
+        self.assertEqual(response["Content-Type"], "image/png")
+
+
+class ServiceReminderTests(VehicleTestCase):
+    def test_due_dates_use_date_and_mileage_intervals(self):
+        car = self.vehicle
+        van = Vehicle.objects.create(name="Van", plate_number="VAN-1234")
+        for vehicle, service_type, date, mileage in [
+            # The car drives 50 km a day
+            (car, "oil_change", datetime.date(2024, 1, 1), 10000),
+            (car, "inspection", datetime.date(2024, 3, 1), 13000),
+            # The van has no mileage history
+            (van, "oil_change", datetime.date(2024, 1, 1), None),
+            (van, "repair", datetime.date(2024, 2, 1), None),
+        ]:
+            self.create_service(
+                date, vehicle=vehicle, service_type=service_type, mileage=mileage
+            )
+
+        today = datetime.date(2024, 4, 15)
+        with self.assertNumQueries(6):
+            refresh_reminders(today)
+        reminders = {
+            (r.vehicle.name, r.service_type): r
+            for r in ServiceReminder.objects.select_related("vehicle")
+        }
+
+        self.assertEqual(len(reminders), 3)
+        oil = reminders["Car", "oil_change"]
+        # 5000 km at 50 km a day comes before 180 days
+        self.assertEqual(oil.due_date, datetime.date(2024, 4, 10))
+        self.assertEqual(oil.due_mileage, 15000)
+        self.assertEqual(oil.estimated_mileage, 15250)
+        self.assertEqual(
+            reminders["Car", "inspection"].due_date, datetime.date(2025, 3, 1)
+        )
+        self.assertEqual(
+            reminders["Van", "oil_change"].due_date, datetime.date(2024, 6, 29)
+        )
+        self.assertEqual(list(ServiceReminder.objects.overdue(today)), [oil])
+
+        self.client.force_login(self.admin)
+        # Every due date above has passed by now
+        response = self.client.get(reverse("admin:index"))
+        self.assertContains(response, "Overdue Services (3)")
+
+
+class PartSearchTests(VehicleTestCase):
+    def setUp(self):
+        self.shops = [
+            Shop.objects.create(name=name, location="Colombo")
+            for name in ("Auto Parts", "Spares Hub")
+        ]
+        self.services = [
+            self.create_service(datetime.date(2024, month, 1)) for month in (1, 2, 3)
+        ]
+
+    def add_part(self, service, shop, name, quantity, total_cost):
+        return ServicePart.objects.create(
+            service=service,
+            shop=shop,
+            part_name=name,
+            quantity=quantity,
+            total_cost=Decimal(total_cost),
+        )
+
+    def test_search_index_follows_writes(self):
+        pads = self.add_part(self.services[0], self.shops[0], "Brake Pads", 1, "10")
+        self.add_part(self.services[0], self.shops[0], "Oil filter", 1, "10")
+
+        def names(query):
+            parts = search_parts(ServicePart.objects.all(), query)
+            return sorted(parts.values_list("part_name", flat=True))
+
+        self.assertEqual(names("brake pad"), ["Brake Pads"])
+        self.assertEqual(names("FILT"), ["Oil filter"])
+        pads.part_name = "Front disc pads"
+        pads.save()
+        self.assertEqual(names("brake"), [])
+        self.assertEqual(names("disc"), ["Front disc pads"])
+        pads.delete()
+        self.assertEqual(names("pads"), [])
+
+    def test_migrate_restores_dropped_triggers(self):
+        # As left by a migration that rebuilt vehicle_servicepart
+        with connection.cursor() as cursor:
+            cursor.execute(f"DROP TRIGGER {SEARCH_TABLE}_insert")
+        self.add_part(self.services[0], self.shops[0], "Spark plug", 4, "2000")
+        emit_post_migrate_signal(verbosity=0, interactive=False, db="default")
+        parts = search_parts(ServicePart.objects.all(), "spark")
+        self.assertEqual(
+            list(parts.values_list("part_name", flat=True)), ["Spark plug"]
+        )
+
+    def test_price_history_per_shop(self):
+        first, second = self.shops
+        self.add_part(self.services[0], first, "Brake pads", 3, "1000")
+        self.add_part(self.services[1], second, "Brake pads (front)", 2, "900")
+        self.add_part(self.services[2], first, "brake pads", 4, "1600")
+
+        report = price_history("brake pads")
+
+        self.assertEqual(
+            [part.unit_cost for part in report["history"]],
+            [Decimal("400.00"), Decimal("450.00"), Decimal("333.33")],
+        )
+        latest, other = report["shops"]
+        self.assertEqual(latest["last"].shop, first)
+        self.assertEqual(latest["purchases"], 2)
+        self.assertEqual(latest["last"].unit_cost, Decimal("400.00"))
+        self.assertEqual(latest["lowest"], Decimal("333.33"))
+        self.assertEqual(other["last"].shop, second)
+
+        self.client.force_login(self.admin)
+        response = self.client.get(
+            reverse("admin:parts-price-history"), {"q": "brake pads"}
+        )
+        self.assertContains(response, "Brake pads (front)")
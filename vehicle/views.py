@@ -1,3 +1,188 @@
-from django.shortcuts import render
+import datetime
+import hashlib
+import mimetypes
+import os
 
-# Create your views here.
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse
+from django.shortcuts import get_object_or_404
+from django.template.response import TemplateResponse
+from django.utils import timezone
+from django.utils.http import content_disposition_header, http_date, quote_etag
+from django.views.decorators.http import condition, require_safe
+
+from budget.admin import admin_site
+
+from .analytics import build_analytics
+from .cache import get_cached_analytics
+from .models import VehicleServiceDocument
+from .search import HISTORY_LIMIT, price_history
+
+
+def vehicle_analytics_view(request):
+    if not request.user.has_perm("vehicle.view_vehicleservice"):
+        raise PermissionDenied
+    analytics = get_cached_analytics(timezone.localdate(), build_analytics)
+    context = dict(
+        admin_site.each_context(request),
+        title="Vehicle Analytics",
+        **analytics,
+    )
+    return TemplateResponse(request, "admin/vehicle_analytics.html", context)
+
+
+def parts_price_history_view(request):
+    if not request.user.has_perm("vehicle.view_vehicleservice"):
+        raise PermissionDenied
+    query = request.GET.get("q", "").strip()
+    context = dict(
+        admin_site.each_context(request),
+        title="Parts Price History",
+        query=query,
+        history_limit=HISTORY_LIMIT,
+        **(price_history(query) if query else {}),
+    )
+    return TemplateResponse(request, "admin/parts_price_history.html", context)
+
+
+class FileRange:
+    """Read at most ``length`` bytes of ``file`` from its current position.
+
+    Keeps ``fileno()`` so WSGI servers with a sendfile file wrapper (which
+    send ``Content-Length`` bytes from the current offset) stay zero-copy.
+    """
+
+    def __init__(self, file, length):
+        self.file = file
+        self.remaining = length
+
+    def read(self, size=-1):
+        if self.remaining <= 0:
+            return b""
+        size = self.remaining if size is None or size < 0 else min(size, self.remaining)
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self.file.fileno()
+
+    def close(self):
+        self.file.close()
+
+
+def parse_range(header, size):
+    """Resolve a single ``bytes=`` range against ``size``.
+
+    Returns ``(start, end)`` inclusive, ``None`` when the header should be
+    ignored (absent, malformed, multi-range or ending before it starts) and
+    ``False`` when the range starts past the end of the file.
+    """
+    unit, _, spec = (header or "").partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        if not first:
+            suffix = int(last)
+            if suffix <= 0:
+                return False
+            return max(size - suffix, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if last and end < start:
+        return None
+    if start >= size:
+        return False
+    return start, min(end, size - 1)
+
+
+# The original upload and the images rendered from it by the preview worker
+DOCUMENT_VARIANTS = ("document", "thumbnail", "preview")
+
+
+def get_document_file(request, pk, variant="document"):
+    """The document file and its stats, memoized for the condition callbacks."""
+    if not hasattr(request, "_document_file"):
+        if not request.user.has_perm("vehicle.view_vehicleservicedocument"):
+            raise PermissionDenied
+        if variant not in DOCUMENT_VARIANTS:
+            raise Http404("Unknown document variant")
+        document = get_object_or_404(VehicleServiceDocument, pk=pk)
+        file = getattr(document, variant)
+        try:
+            stat = os.stat(file.path)
+        except (FileNotFoundError, ValueError):
+            raise Http404("Document file is missing")
+        request._document_file = (document, file, stat)
+    return request._document_file
+
+
+def document_etag(request, pk, variant="document"):
+    _, file, stat = get_document_file(request, pk, variant)
+    return hashlib.md5(
+        f"{file.name}|{stat.st_size}|{stat.st_mtime_ns}".encode(),
+        usedforsecurity=False,
+    ).hexdigest()
+
+
+def document_last_modified(request, pk, variant="document"):
+    _, _, stat = get_document_file(request, pk, variant)
+    return datetime.datetime.fromtimestamp(stat.st_mtime, tz=datetime.timezone.utc)
+
+
+@require_safe
+@condition(etag_func=document_etag, last_modified_func=document_last_modified)
+def document_download_view(request, pk, variant="document"):
+    document, file, stat = get_document_file(request, pk, variant)
+    filename = document.original_name or os.path.basename(document.document.name)
+    if variant != "document":
+        filename = f"{os.path.splitext(filename)[0]}-{variant}.png"
+    content_type = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+
+    if settings.DOCUMENT_SENDFILE_HEADER:
+        # The web server sends the file and handles Range itself
+        response = HttpResponse(content_type=content_type)
+        if settings.DOCUMENT_SENDFILE_HEADER.lower() == "x-sendfile":
+            location = file.path
+        else:
+            location = settings.DOCUMENT_SENDFILE_PREFIX + file.name
+        response[settings.DOCUMENT_SENDFILE_HEADER] = location
+        response["Content-Disposition"] = content_disposition_header(False, filename)
+        return response
+
+    size = stat.st_size
+    byte_range = parse_range(request.headers.get("Range"), size)
+    if_range = request.headers.get("If-Range")
+    if if_range and if_range not in (
+        quote_etag(document_etag(request, pk, variant)),
+        http_date(stat.st_mtime),
+    ):
+        # The client's partial copy is stale: send the whole file
+        byte_range = None
+
+    if byte_range is False:
+        response = HttpResponse(status=416)
+        response["Content-Range"] = f"bytes */{size}"
+        return response
+
+    file = file.open("rb")
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type, filename=filename)
+    else:
+        start, end = byte_range
+        file.seek(start)
+        response = FileResponse(
+            FileRange(file, end - start + 1),
+            status=206,
+            content_type=content_type,
+            filename=filename,
+        )
+        response["Content-Length"] = end - start + 1
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    response["Accept-Ranges"] = "bytes"
+    response["Cache-Control"] = "private, max-age=0, must-revalidate"
+    return response